@@ -123,13 +123,24 @@ class Advertisement(dbus.service.Object):
     def register_ad_error_callback(self, error):
         print(f"✗ Failed to register GATT advertisement: {error}")
 
-    def register(self):
+    def register(self, on_registered=None, on_error=None):
+        """Register with BlueZ, the optional callbacks run on its reply"""
         bus = BleTools.get_bus()
         adapter = BleTools.find_adapter(bus)
 
+        def reply():
+            self.register_ad_callback()
+            if on_registered:
+                on_registered()
+
+        def error(e):
+            self.register_ad_error_callback(e)
+            if on_error:
+                on_error(e)
+
         ad_manager = dbus.Interface(bus.get_object(BLUEZ_SERVICE_NAME, adapter),
                                 LE_ADVERTISING_MANAGER_IFACE)
         ad_manager.RegisterAdvertisement(self.get_path(), {},
-                                     reply_handler=self.register_ad_callback,
-                                     error_handler=self.register_ad_error_callback)
+                                     reply_handler=reply,
+                                     error_handler=error)
         
\ No newline at end of file
@@ -1,9 +1,15 @@
 import sys
 import atexit
-import time
 import threading
+from collections import deque
 from Comms.bluetooth.service import Application
-from Comms.bluetooth.sensor import SensorService, SensorAdvertisement
+from Comms.bluetooth.sensor import (HeartRateService, PulseOximeterService,
+                                    SensorService, SensorAdvertisement)
+
+BLUEZ_SERVICE_NAME = "org.bluez"
+DEVICE_IFACE = "org.bluez.Device1"
+DBUS_OM_IFACE = "org.freedesktop.DBus.ObjectManager"
+DBUS_PROP_IFACE = "org.freedesktop.DBus.Properties"
 
 
 class BLEAgent:
@@ -13,69 +19,141 @@ class BLEAgent:
         self._ble_app = None
         self._ble_hr_characteristic = None
         self._ble_o2_characteristic = None
+        self._ble_vitals_characteristic = None
+        self._ble_history_characteristic = None
         self._ble_thread = None
         self._ble_running = False
         self._ble_advertisement = None
         self._initialized = False
 
+        # Set once the application and advertisement are registered
+        self._ready = threading.Event()
+        self._error = None
+
+        # Latest reading waiting for the mainloop, a one-slot deque so
+        # append and popleft are atomic and newer readings replace older
+        self._pending = deque(maxlen=1)
+        self._dispatch_scheduled = False
+        self.dispatched = 0
+        self.coalesced = 0
+
+        # Live view of BlueZ devices, path -> {"connected", "rssi"}.
+        # Replaced, never mutated, so other threads read it without a lock
+        self._devices = {}
+        self._watching_devices = False
+
         # Register cleanup handler only
         atexit.register(self.cleanup)
 
     def start(self):
-        """Start BLE service"""
+        """
+        Start BLE service
+
+        Returns once the mainloop is running, without waiting for BlueZ.
+        Use wait_ready() to block until the device is advertising.
+        """
+        self._ready.clear()
+        self._error = None
         try:
             #print("🔄 Initializing BLE service...")
 
             # Create BLE application
             self._ble_app = Application()
 
-            # Create sensor service
-            sensor_service = SensorService(0)
+            # Standard services for stock clients, the custom one for ours
+            hr_service = HeartRateService(0)
+            plx_service = PulseOximeterService(1)
+            sensor_service = SensorService(
+                2, supersedes=(hr_service.hr_characteristic,
+                               plx_service.o2_characteristic))
+            services = (hr_service, plx_service, sensor_service)
 
             # Store references to characteristics BEFORE adding to app
             self._ble_hr_characteristic = None
             self._ble_o2_characteristic = None
+            self._ble_vitals_characteristic = None
+            self._ble_history_characteristic = None
 
-            for characteristic in sensor_service.characteristics:
+            for characteristic in (c for service in services
+                                   for c in service.characteristics):
                 if hasattr(characteristic, 'HR_CHARACTERISTIC_UUID'):
                     self._ble_hr_characteristic = characteristic
                     #print("✓ Found HR characteristic")
                 elif hasattr(characteristic, 'O2_CHARACTERISTIC_UUID'):
                     self._ble_o2_characteristic = characteristic
                     #print("✓ Found O2 characteristic")
+                elif hasattr(characteristic, 'VITALS_CHARACTERISTIC_UUID'):
+                    self._ble_vitals_characteristic = characteristic
+                elif hasattr(characteristic, 'HISTORY_CHARACTERISTIC_UUID'):
+                    self._ble_history_characteristic = characteristic
 
-            # Add service to application
-            self._ble_app.add_service(sensor_service)
-
-            # Register BLE application
-            self._ble_app.register()
-            #print("✓ GATT application registered")
-
-            # Wait a moment before registering advertisement (critical timing!)
-            time.sleep(0.5)
+            # Add services to application
+            for service in services:
+                self._ble_app.add_service(service)
 
-            # CREATE AND REGISTER ADVERTISEMENT
-            self._ble_advertisement = SensorAdvertisement(0)
-            self._ble_advertisement.register()
-            #print("✓ BLE advertisement registered")
+            # Track connected clients from BlueZ signals
+            try:
+                self._watch_devices()
+            except Exception as e:
+                print(f"⚠ BLE client tracking unavailable: {e}")
 
             # Start BLE in background thread
             self._ble_running = True
             self._ble_thread = threading.Thread(target=self._run_ble, daemon=True)
             self._ble_thread.start()
 
+            # Register from the mainloop, the advertisement follows once
+            # BlueZ has accepted the application instead of after a sleep
+            self._ble_app.idle_add(self._register)
+
             self._initialized = True
             #print("✓ BLE service started successfully")
-            print("📱 Device should now appear as 'HealthSensor' in nRF Connect")
-            time.sleep(3)
             return True
 
         except Exception as e:
             print(f"✗ Failed to start BLE service: {e}")
             import traceback
             traceback.print_exc()
+            self._error = e
+            self._ready.set()
             return False
 
+    def _register(self):
+        """Register the GATT application, runs in the mainloop thread"""
+        try:
+            self._ble_app.register(on_registered=self._register_advertisement,
+                                   on_error=self._on_register_error)
+        except Exception as e:
+            self._on_register_error(e)
+        return False
+
+    def _register_advertisement(self):
+        try:
+            self._ble_advertisement = SensorAdvertisement(0)
+            self._ble_advertisement.register(on_registered=self._on_advertising,
+                                             on_error=self._on_register_error)
+        except Exception as e:
+            self._on_register_error(e)
+
+    def _on_advertising(self):
+        print("📱 Device should now appear as 'HealthSensor' in nRF Connect")
+        self._ready.set()
+
+    def _on_register_error(self, error):
+        print(f"✗ Failed to start BLE service: {error}")
+        self._error = error
+        self._ready.set()
+
+    def wait_ready(self, timeout=None):
+        """
+        Wait until BlueZ registered the application and advertisement
+
+        Returns:
+            bool: True if the device is advertising
+        """
+        self._ready.wait(timeout)
+        return self._ready.is_set() and self._error is None
+
     def _run_ble(self):
         """Run BLE mainloop in separate thread"""
         try:
@@ -85,25 +163,162 @@ class BLEAgent:
         finally:
             self._ble_running = False
 
+    def record_reading(self, heart_rate, oxygen_level):
+        """
+        Buffer a reading for history catch-up without notifying
+
+        Used for readings sent over another network, so a client that
+        reconnects can still fetch them.
+
+        Returns:
+            int: History sequence number, None if BLE is not running
+        """
+        if not self._initialized or not self._ble_history_characteristic:
+            return None
+        return self._ble_history_characteristic.record(heart_rate, oxygen_level)
+
     def update_data(self, heart_rate, oxygen_level):
-        """Update BLE characteristics with current sensor data - always send"""
+        """
+        Post a reading to the BLE characteristics, clients are notified
+        only on change
+
+        Returns immediately. The characteristics belong to the GLib
+        mainloop, so the update is handed over with idle_add and applied
+        in that thread. Readings posted faster than the mainloop runs
+        are coalesced, only the latest one is applied.
+        """
         if not self._initialized:
             return
 
+        try:
+            seq = self.record_reading(heart_rate, oxygen_level)
+
+            if len(self._pending):
+                self.coalesced += 1
+            self._pending.append((heart_rate, oxygen_level, seq))
+            if not self._dispatch_scheduled:
+                self._dispatch_scheduled = True
+                self._ble_app.idle_add(self._dispatch)
+
+        except Exception as e:
+            print(f"⚠ BLE data update error: {e}")
+
+    def _dispatch(self):
+        """Apply the latest reading, runs in the mainloop thread"""
+        # Clear the flag before taking the reading, so a reading posted
+        # after the pop always schedules another dispatch
+        self._dispatch_scheduled = False
+        try:
+            heart_rate, oxygen_level, seq = self._pending.popleft()
+        except IndexError:
+            return False
+
         try:
             if self._ble_hr_characteristic:
                 self._ble_hr_characteristic.set_heart_rate(heart_rate)
 
             if self._ble_o2_characteristic:
-                self._ble_o2_characteristic.set_oxygen_level(oxygen_level)
-                
+                self._ble_o2_characteristic.set_oxygen_level(
+                    oxygen_level, pulse_rate=heart_rate)
+
+            if self._ble_vitals_characteristic:
+                self._ble_vitals_characteristic.set_vitals(
+                    heart_rate, oxygen_level, seq=seq)
+
+            self.dispatched += 1
+
         except Exception as e:
             print(f"⚠ BLE data update error: {e}")
+        return False
 
     def is_running(self):
         """Check if BLE agent is initialized and running"""
         return self._initialized and self._ble_running
 
+    # ------------------------------
+    # CLIENT TRACKING
+    # ------------------------------
+    def _watch_devices(self):
+        """Seed the device view once, then follow BlueZ signals"""
+        if self._watching_devices:
+            return
+
+        import dbus
+        bus = self._ble_app.bus
+        bus.add_signal_receiver(self._on_device_changed,
+                                dbus_interface=DBUS_PROP_IFACE,
+                                signal_name="PropertiesChanged",
+                                bus_name=BLUEZ_SERVICE_NAME,
+                                arg0=DEVICE_IFACE,
+                                path_keyword="path")
+        bus.add_signal_receiver(self._on_interfaces_added,
+                                dbus_interface=DBUS_OM_IFACE,
+                                signal_name="InterfacesAdded",
+                                bus_name=BLUEZ_SERVICE_NAME)
+        bus.add_signal_receiver(self._on_interfaces_removed,
+                                dbus_interface=DBUS_OM_IFACE,
+                                signal_name="InterfacesRemoved",
+                                bus_name=BLUEZ_SERVICE_NAME)
+        self._watching_devices = True
+
+        remote_om = dbus.Interface(bus.get_object(BLUEZ_SERVICE_NAME, "/"),
+                                   DBUS_OM_IFACE)
+        for path, props in remote_om.GetManagedObjects().items():
+            if DEVICE_IFACE in props:
+                self._update_device(str(path), props[DEVICE_IFACE])
+
+    def _update_device(self, path, changed):
+        device = dict(self._devices.get(path, {"connected": False, "rssi": None}))
+        if "Connected" in changed:
+            device["connected"] = bool(changed["Connected"])
+        if "RSSI" in changed:
+            rssi = changed["RSSI"]
+            device["rssi"] = None if rssi is None else int(rssi)
+
+        devices = dict(self._devices)
+        devices[path] = device
+        self._devices = devices
+
+    def _on_device_changed(self, interface, changed, invalidated, path=None):
+        changed = dict(changed)
+        if "RSSI" in invalidated:
+            changed["RSSI"] = None
+        self._update_device(str(path), changed)
+
+    def _on_interfaces_added(self, path, interfaces):
+        if DEVICE_IFACE in interfaces:
+            self._update_device(str(path), interfaces[DEVICE_IFACE])
+
+    def _on_interfaces_removed(self, path, interfaces):
+        if DEVICE_IFACE in interfaces and str(path) in self._devices:
+            devices = dict(self._devices)
+            del devices[str(path)]
+            self._devices = devices
+
+    def connected_clients(self):
+        """Paths of centrals currently connected"""
+        return [path for path, d in self._devices.items() if d["connected"]]
+
+    def has_subscribers(self):
+        """True if a client enabled notifications (StartNotify) on any value"""
+        return any(
+            c is not None and c.notifying
+            for c in (self._ble_hr_characteristic,
+                      self._ble_o2_characteristic,
+                      self._ble_vitals_characteristic)
+        )
+
+    def has_listener(self):
+        """Running, with a connected central that is subscribed"""
+        return (self.is_running() and self.has_subscribers()
+                and len(self.connected_clients()) > 0)
+
+    def client_rssi(self):
+        """Best RSSI (dBm) among connected clients, None if unknown"""
+        rssi = [d["rssi"] for d in self._devices.values()
+                if d["connected"] and d["rssi"] is not None]
+        return max(rssi) if rssi else None
+
     def cleanup(self):
         """Properly shutdown BLE service"""
         if not self._initialized:
@@ -20,6 +20,8 @@ SOFTWARE.
 """
 
 import dbus
+import dbus.mainloop.glib
+import threading
 try:
   from gi.repository import GObject
 except ImportError:
@@ -30,27 +32,82 @@ LE_ADVERTISING_MANAGER_IFACE = "org.bluez.LEAdvertisingManager1"
 DBUS_OM_IFACE = "org.freedesktop.DBus.ObjectManager"
 
 class BleTools(object):
+    """
+    Process-wide D-Bus helpers
+
+    The system bus connection and the adapter path are looked up once
+    and cached. The adapter cache is dropped when BlueZ reports
+    InterfacesAdded/InterfacesRemoved for an adapter, so hot paths do
+    not pay a GetManagedObjects round trip per call.
+    """
+    _bus = None
+    _adapter = None
+    _watching = False
+    _lock = threading.Lock()
+
     @classmethod
     def get_bus(self):
-         bus = dbus.SystemBus()
+         if self._bus is None:
+             with self._lock:
+                 if self._bus is None:
+                     # Signals for the cache need the GLib main loop
+                     dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+                     self._bus = dbus.SystemBus()
 
-         return bus
+         return self._bus
 
     @classmethod
     def find_adapter(self, bus):
+        adapter = self._adapter
+        if adapter is not None:
+            return adapter
+
         remote_om = dbus.Interface(bus.get_object(BLUEZ_SERVICE_NAME, "/"),
                                DBUS_OM_IFACE)
         objects = remote_om.GetManagedObjects()
 
         for o, props in objects.items():
             if LE_ADVERTISING_MANAGER_IFACE in props:
+                self._watch_adapters(bus)
+                self._adapter = o
                 return o
 
         return None
 
+    @classmethod
+    def invalidate(self):
+        """Forget the cached adapter, the next lookup scans again"""
+        self._adapter = None
+
+    @classmethod
+    def _watch_adapters(self, bus):
+        with self._lock:
+            if self._watching:
+                return
+            bus.add_signal_receiver(self._interfaces_added,
+                                    dbus_interface=DBUS_OM_IFACE,
+                                    signal_name="InterfacesAdded",
+                                    bus_name=BLUEZ_SERVICE_NAME)
+            bus.add_signal_receiver(self._interfaces_removed,
+                                    dbus_interface=DBUS_OM_IFACE,
+                                    signal_name="InterfacesRemoved",
+                                    bus_name=BLUEZ_SERVICE_NAME)
+            self._watching = True
+
+    @classmethod
+    def _interfaces_added(self, path, interfaces):
+        if LE_ADVERTISING_MANAGER_IFACE in interfaces:
+            self.invalidate()
+
+    @classmethod
+    def _interfaces_removed(self, path, interfaces):
+        if path == self._adapter or LE_ADVERTISING_MANAGER_IFACE in interfaces:
+            self.invalidate()
+
     @classmethod
     def power_adapter(self):
-        adapter = self.get_adapter()
+        bus = self.get_bus()
+        adapter = self.find_adapter(bus)
 
         adapter_props = dbus.Interface(bus.get_object(BLUEZ_SERVICE_NAME, adapter),
                 "org.freedesktop.DBus.Properties");
@@ -1,40 +1,146 @@
 import dbus
+import struct
+import itertools
 import time
+from collections import deque
 
 from Comms.bluetooth.advertisement import Advertisement
-from Comms.bluetooth.service import Application, Service, Characteristic, Descriptor
+from Comms.bluetooth.service import (Application, Service, Characteristic, Descriptor,
+                                     InvalidArgsException)
 
 GATT_CHRC_IFACE = "org.bluez.GattCharacteristic1"
 NOTIFY_TIMEOUT = 5000
+# Unchanged values are re-sent at most this often (seconds)
+KEEPALIVE_INTERVAL = 30
+
+# dbus.Byte for every value, built once instead of per notification
+DBUS_BYTES = [dbus.Byte(i) for i in range(256)]
+
+# IEEE-11073 16-bit SFLOAT special value for "no reading"
+SFLOAT_NAN = 0x07FF
+SFLOAT_MAX = 0x07FD
+
+PLX_CONTINUOUS = struct.Struct("<BHH")
+# PLX Features (0x2A60): supported features u16, none of the optional ones
+PLX_FEATURES = struct.pack("<H", 0x0000)
+
+# Combined vitals: hr u16, spo2 u8, unix ts u32, seq u16 (0xFF.. = no reading)
+VITALS_RECORD = struct.Struct("<HBIH")
+
+# History requests written by the client: opcode u8 [, since seq u16]
+HISTORY_ALL = 0x01
+HISTORY_SINCE = 0x02
+HISTORY_ABORT = 0x03
+HISTORY_SINCE_REQ = struct.Struct("<BH")
+# Read value of the history characteristic: count, oldest seq, newest seq
+HISTORY_STATUS = struct.Struct("<HHH")
+# ATT notification header (3) plus the batch count byte
+HISTORY_OVERHEAD = 4
+DEFAULT_MTU = 23
+
+
+def to_dbus_bytes(data):
+    return dbus.Array([DBUS_BYTES[b] for b in data], signature="y")
+
+
+def sfloat(value):
+    """Encode a reading as SFLOAT with exponent 0, -1/None become NaN"""
+    if value is None or value < 0:
+        return SFLOAT_NAN
+    return min(int(round(value)), SFLOAT_MAX)
+
+
+def encode_heart_rate(hr):
+    """Heart Rate Measurement (0x2A37): flags, then UINT8 or UINT16 bpm"""
+    hr = max(0, int(hr))
+    if hr > 0xFF:
+        return struct.pack("<BH", 0x01, min(hr, 0xFFFF))
+    return struct.pack("<BB", 0x00, hr)
+
+
+def encode_plx_continuous(spo2, pulse_rate=None):
+    """PLX Continuous Measurement (0x2A5F): flags, SpO2 and PR as SFLOAT"""
+    return PLX_CONTINUOUS.pack(0x00, sfloat(spo2), sfloat(pulse_rate))
+
+
+def encode_vitals(hr, spo2, timestamp, seq):
+    """One combined vitals record, see VITALS_RECORD"""
+    hr = 0xFFFF if hr is None or hr < 0 else min(int(hr), 0xFFFE)
+    spo2 = 0xFF if spo2 is None or spo2 < 0 else min(int(spo2), 0xFE)
+    return VITALS_RECORD.pack(hr, spo2, int(timestamp) & 0xFFFFFFFF,
+                              seq & 0xFFFF)
 
 class SensorAdvertisement(Advertisement):
     def __init__(self, index):
         Advertisement.__init__(self, index, "peripheral")
         self.add_local_name("HealthSensor")
+        self.add_service_uuid(HeartRateService.HR_SVC_UUID_16)
+        self.add_service_uuid(PulseOximeterService.PLX_SVC_UUID_16)
         self.include_tx_power = True
         print("✓ SensorAdvertisement created")
 
 
+class HeartRateService(Service):
+    # Standard Heart Rate service, found by stock heart rate apps
+    HR_SVC_UUID = "0000180d-0000-1000-8000-00805f9b34fb"
+    HR_SVC_UUID_16 = "180D"
+
+    def __init__(self, index):
+        Service.__init__(self, index, self.HR_SVC_UUID, True)
+
+        self.hr_characteristic = HRCharacteristic(self)
+        self.add_characteristic(self.hr_characteristic)
+
+class PulseOximeterService(Service):
+    # Standard Pulse Oximeter service, found by stock PLX clients
+    PLX_SVC_UUID = "00001822-0000-1000-8000-00805f9b34fb"
+    PLX_SVC_UUID_16 = "1822"
+
+    def __init__(self, index):
+        Service.__init__(self, index, self.PLX_SVC_UUID, True)
+
+        self.o2_characteristic = O2Characteristic(self)
+        self.add_characteristic(self.o2_characteristic)
+        self.add_characteristic(PLXFeaturesCharacteristic(self))
+
 class SensorService(Service):
+    # Custom service for the combined vitals and the history catch-up
     SENSOR_SVC_UUID = "31c8f278-7301-4dde-b3e3-ea763aa3fdb7"
 
-    def __init__(self, index):
+    def __init__(self, index, supersedes=()):
+        """
+        Initialize sensor service
+
+        Args:
+            index: Service index, unique within the application
+            supersedes: Standard characteristics that stay read-only
+                while the vitals characteristic is subscribed
+        """
         Service.__init__(self, index, self.SENSOR_SVC_UUID, True)
 
         # Create characteristics and store references
-        self.hr_characteristic = HRCharacteristic(self)
-        self.o2_characteristic = O2Characteristic(self)
+        self.vitals_characteristic = VitalsCharacteristic(self)
+        self.history_characteristic = HistoryCharacteristic(self)
 
         # Add to service
-        self.add_characteristic(self.hr_characteristic)
-        self.add_characteristic(self.o2_characteristic)
+        self.add_characteristic(self.vitals_characteristic)
+        self.add_characteristic(self.history_characteristic)
+
+        # A vitals subscriber already gets HR and SpO2 in one notification
+        for characteristic in supersedes:
+            characteristic.superseded_by = self.vitals_characteristic
 
 class HRCharacteristic(Characteristic):
-    HR_CHARACTERISTIC_UUID = "c1850dfb-ecee-4081-ad61-2442c5f5c341"
+    # Standard Heart Rate Measurement, readable by stock BLE clients
+    HR_CHARACTERISTIC_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
 
     def __init__(self, service):
         self.notifying = False
         self.heart_rate = 0
+        self._value = to_dbus_bytes(encode_heart_rate(0))
+        self._last_notify = 0.0
+        self._timer = None
+        self.superseded_by = None
 
         Characteristic.__init__(
             self, self.HR_CHARACTERISTIC_UUID,
@@ -43,25 +149,33 @@ class HRCharacteristic(Characteristic):
 
     def set_heart_rate(self, hr_value):
         """Update heart rate value - no validation"""
+        if hr_value == self.heart_rate:
+            return False
         self.heart_rate = hr_value
+        self._value = to_dbus_bytes(encode_heart_rate(hr_value))
         # Notify connected clients of the change
-        if self.notifying:
-            value = self.get_heartrate()
-            self.PropertiesChanged(GATT_CHRC_IFACE, {"Value": value}, [])
+        if self._should_notify():
+            self._notify()
         return True
 
+    def _should_notify(self):
+        """Stay read-only while the same reading goes out as vitals"""
+        return self.notifying and not (self.superseded_by is not None
+                                       and self.superseded_by.notifying)
+
+    def _notify(self):
+        self._last_notify = time.monotonic()
+        self.PropertiesChanged(GATT_CHRC_IFACE, {"Value": self._value}, [])
+
     def get_heartrate(self):
-        """Return heart rate as string bytes (simpler approach)"""
-        value = []
-        hr_str = str(self.heart_rate)
-        for char in hr_str:
-            value.append(dbus.Byte(char.encode()))
-        return value
+        """Return the encoded Heart Rate Measurement, rebuilt only on change"""
+        return self._value
 
     def set_heartrate_callback(self):
-        if self.notifying:
-            value = self.get_heartrate()
-            self.PropertiesChanged(GATT_CHRC_IFACE, {"Value": value}, [])
+        """Keepalive, re-sends the value only if nothing went out recently"""
+        if (self._should_notify() and
+                time.monotonic() - self._last_notify >= KEEPALIVE_INTERVAL):
+            self._notify()
         return self.notifying
 
     def StartNotify(self):
@@ -69,12 +183,15 @@ class HRCharacteristic(Characteristic):
             return
         self.notifying = True
 
-        value = self.get_heartrate()
-        self.PropertiesChanged(GATT_CHRC_IFACE, {"Value": value}, [])
-        self.add_timeout(NOTIFY_TIMEOUT, self.set_heartrate_callback)
+        if self._should_notify():
+            self._notify()
+        self._timer = self.add_timeout(NOTIFY_TIMEOUT, self.set_heartrate_callback)
 
     def StopNotify(self):
         self.notifying = False
+        if self._timer:
+            self.remove_timeout(self._timer)
+            self._timer = None
 
     def ReadValue(self, options):
         """This is called when a client reads the characteristic"""
@@ -98,38 +215,53 @@ class HRDescriptor(Descriptor):
         return value
 
 class O2Characteristic(Characteristic):
-    O2_CHARACTERISTIC_UUID = "95f75eed-bb38-423c-b67b-e2d3c16e0c3e"
+    # Standard PLX Continuous Measurement, readable by stock BLE clients
+    O2_CHARACTERISTIC_UUID = "00002a5f-0000-1000-8000-00805f9b34fb"
 
     def __init__(self, service):
         self.notifying = False
         self.oxygen_level = 0
+        self.pulse_rate = None
+        self._value = to_dbus_bytes(encode_plx_continuous(None))
+        self._last_notify = 0.0
+        self._timer = None
+        self.superseded_by = None
 
         Characteristic.__init__(
             self, self.O2_CHARACTERISTIC_UUID,
             ["read", "notify"], service)
         self.add_descriptor(O2Descriptor(self))
 
-    def set_oxygen_level(self, o2_value):
-        """Update oxygen level value - no validation"""
+    def set_oxygen_level(self, o2_value, pulse_rate=None):
+        """Update oxygen level (and optional pulse rate) - no validation"""
+        if o2_value == self.oxygen_level and pulse_rate == self.pulse_rate:
+            return False
         self.oxygen_level = o2_value
+        self.pulse_rate = pulse_rate
+        self._value = to_dbus_bytes(encode_plx_continuous(o2_value, pulse_rate))
         # Notify connected clients of the change
-        if self.notifying:
-            value = self.get_oxygen()
-            self.PropertiesChanged(GATT_CHRC_IFACE, {"Value": value}, [])
+        if self._should_notify():
+            self._notify()
         return True
 
+    def _should_notify(self):
+        """Stay read-only while the same reading goes out as vitals"""
+        return self.notifying and not (self.superseded_by is not None
+                                       and self.superseded_by.notifying)
+
+    def _notify(self):
+        self._last_notify = time.monotonic()
+        self.PropertiesChanged(GATT_CHRC_IFACE, {"Value": self._value}, [])
+
     def get_oxygen(self):
-        """Return oxygen level as string bytes (simpler approach)"""
-        value = []
-        o2_str = str(self.oxygen_level)
-        for char in o2_str:
-            value.append(dbus.Byte(char.encode()))
-        return value
+        """Return the encoded PLX Continuous Measurement, rebuilt only on change"""
+        return self._value
 
     def set_oxygen_callback(self):
-        if self.notifying:
-            value = self.get_oxygen()
-            self.PropertiesChanged(GATT_CHRC_IFACE, {"Value": value}, [])
+        """Keepalive, re-sends the value only if nothing went out recently"""
+        if (self._should_notify() and
+                time.monotonic() - self._last_notify >= KEEPALIVE_INTERVAL):
+            self._notify()
         return self.notifying
 
     def StartNotify(self):
@@ -137,18 +269,34 @@ class O2Characteristic(Characteristic):
             return
         self.notifying = True
 
-        value = self.get_oxygen()
-        self.PropertiesChanged(GATT_CHRC_IFACE, {"Value": value}, [])
-        self.add_timeout(NOTIFY_TIMEOUT, self.set_oxygen_callback)
+        if self._should_notify():
+            self._notify()
+        self._timer = self.add_timeout(NOTIFY_TIMEOUT, self.set_oxygen_callback)
 
     def StopNotify(self):
         self.notifying = False
+        if self._timer:
+            self.remove_timeout(self._timer)
+            self._timer = None
 
 
     def ReadValue(self, options):
         """This is called when a client reads the characteristic"""
         return self.get_oxygen()
 
+class PLXFeaturesCharacteristic(Characteristic):
+    # Mandatory in the Pulse Oximeter service
+    PLX_FEATURES_UUID = "00002a60-0000-1000-8000-00805f9b34fb"
+
+    def __init__(self, service):
+        self._value = to_dbus_bytes(PLX_FEATURES)
+        Characteristic.__init__(
+            self, self.PLX_FEATURES_UUID,
+            ["read"], service)
+
+    def ReadValue(self, options):
+        return self._value
+
 class O2Descriptor(Descriptor):
     O2_DESCRIPTOR_UUID = "2901"
     O2_DESCRIPTOR_VALUE = "Oxygen Saturation (%)"
@@ -166,4 +314,259 @@ class O2Descriptor(Descriptor):
             value.append(dbus.Byte(c.encode()))
         return value
 
+class VitalsCharacteristic(Characteristic):
+    """
+    HR, SpO2, timestamp and sequence number in one VITALS_RECORD
+
+    One notification per reading instead of one per value. Notifications
+    go out only when the reading changed, at most once per min_interval
+    (rapid updates are coalesced into the latest one), plus a keepalive
+    when nothing was sent for keepalive seconds.
+    """
+    VITALS_CHARACTERISTIC_UUID = "4c0205d4-74dd-4095-b4e5-4b2c02f9fac2"
+
+    def __init__(self, service, min_interval=1.0, keepalive=KEEPALIVE_INTERVAL):
+        self.notifying = False
+        self.heart_rate = None
+        self.oxygen_level = None
+        self.seq = 0
+        self.min_interval = min_interval
+        self.keepalive = keepalive
+        self._value = to_dbus_bytes(encode_vitals(None, None, 0, 0))
+        self._last_notify = 0.0
+        self._dirty = False
+        self._flush_pending = False
+        self._timer = None
+
+        Characteristic.__init__(
+            self, self.VITALS_CHARACTERISTIC_UUID,
+            ["read", "notify"], service)
+        self.add_descriptor(VitalsDescriptor(self))
+
+    def set_vitals(self, hr_value, o2_value, timestamp=None, seq=None):
+        """
+        Update the reading, returns False if nothing changed
+
+        seq is the reading's history sequence number, so clients can ask
+        the history characteristic for everything after the last one
+        they saw. Without it the characteristic counts on its own.
+        """
+        if hr_value == self.heart_rate and o2_value == self.oxygen_level:
+            return False
+
+        if timestamp is None:
+            timestamp = time.time()
+        self.heart_rate = hr_value
+        self.oxygen_level = o2_value
+        self.seq = (self.seq + 1 if seq is None else seq) & 0xFFFF
+        self._value = to_dbus_bytes(
+            encode_vitals(hr_value, o2_value, timestamp, self.seq))
+        self._dirty = True
+
+        if self.notifying:
+            self._request_notify()
+        return True
+
+    def _request_notify(self):
+        wait = self.min_interval - (time.monotonic() - self._last_notify)
+        if wait <= 0:
+            self._notify()
+        elif not self._flush_pending:
+            # Coalesce: whatever is latest when the timer fires goes out
+            self._flush_pending = True
+            self.add_timeout(int(wait * 1000) + 1, self._flush)
+
+    def _flush(self):
+        self._flush_pending = False
+        if self._dirty and self.notifying:
+            self._notify()
+        return False
+
+    def _notify(self):
+        self._dirty = False
+        self._last_notify = time.monotonic()
+        self.PropertiesChanged(GATT_CHRC_IFACE, {"Value": self._value}, [])
+
+    def _keepalive_callback(self):
+        if (self.notifying and
+                time.monotonic() - self._last_notify >= self.keepalive):
+            self._notify()
+        return self.notifying
+
+    def StartNotify(self):
+        if self.notifying:
+            return
+        self.notifying = True
+
+        self._notify()
+        self._timer = self.add_timeout(int(self.keepalive * 1000),
+                                       self._keepalive_callback)
+
+    def StopNotify(self):
+        self.notifying = False
+        if self._timer:
+            self.remove_timeout(self._timer)
+            self._timer = None
+
+    def ReadValue(self, options):
+        return self._value
+
+class VitalsDescriptor(Descriptor):
+    VITALS_DESCRIPTOR_UUID = "2901"
+    VITALS_DESCRIPTOR_VALUE = "Vitals (hr u16, spo2 u8, ts u32, seq u16)"
+
+    def __init__(self, characteristic):
+        Descriptor.__init__(
+            self, self.VITALS_DESCRIPTOR_UUID,
+            ["read"],
+            characteristic)
+
+    def ReadValue(self, options):
+        value = []
+        desc = self.VITALS_DESCRIPTOR_VALUE
+        for c in desc:
+            value.append(dbus.Byte(c.encode()))
+        return value
+
+class HistoryCharacteristic(Characteristic):
+    """
+    Bulk catch-up of buffered readings after a reconnect
+
+    Every reading is kept as a VITALS_RECORD in a bounded ring, whether
+    or not it went out over BLE. A client enables notifications, then
+    writes HISTORY_SINCE with the last sequence number it has (or
+    HISTORY_ALL). The records are streamed back as notifications of
+    [count u8][count records], packed to fill the negotiated MTU, and
+    a notification with count 0 ends the transfer.
+
+    Batches are sent from the GLib mainloop a few at a time, so a long
+    backfill never blocks live notifications or D-Bus calls.
+    """
+    HISTORY_CHARACTERISTIC_UUID = "4c0205d5-74dd-4095-b4e5-4b2c02f9fac2"
+
+    def __init__(self, service, capacity=4096, batches_per_tick=8):
+        """
+        Initialize history characteristic
+
+        Args:
+            service: Owning SensorService
+            capacity: Readings kept, the oldest are dropped first
+            batches_per_tick: Notifications sent per mainloop callback
+        """
+        self.notifying = False
+        self.capacity = capacity
+        self.batches_per_tick = batches_per_tick
+        # next() on a count is atomic, record() needs no lock
+        self._counter = itertools.count(1)
+        # (seq, encoded record), appended from any thread
+        self._records = deque(maxlen=capacity)
+        self._transfer = None
+        self._timer = None
+
+        Characteristic.__init__(
+            self, self.HISTORY_CHARACTERISTIC_UUID,
+            ["read", "write", "notify"], service)
+        self.add_descriptor(HistoryDescriptor(self))
+
+    def record(self, hr_value, o2_value, timestamp=None):
+        """
+        Buffer one reading, safe to call from any thread
+
+        Returns:
+            int: The reading's sequence number
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        seq = next(self._counter) & 0xFFFF
+        self._records.append(
+            (seq, encode_vitals(hr_value, o2_value, timestamp, seq)))
+        return seq
+
+    def _records_since(self, since):
+        """Records after seq since, or all of them if it is not buffered"""
+        records = list(self._records)
+        if since is not None:
+            for i in range(len(records) - 1, -1, -1):
+                if records[i][0] == since:
+                    return records[i + 1:]
+        return records
+
+    def _start_transfer(self, records, mtu):
+        per_batch = max(1, (mtu - HISTORY_OVERHEAD) // VITALS_RECORD.size)
+        self._transfer = iter([
+            bytes([len(chunk)]) + b"".join(r for _, r in chunk)
+            for chunk in (records[i:i + per_batch]
+                          for i in range(0, len(records), per_batch))
+        ] + [b"\x00"])
+
+        if self._timer is None:
+            self._timer = self.add_timeout(0, self._send_batches)
+
+    def _send_batches(self):
+        for _ in range(self.batches_per_tick):
+            batch = next(self._transfer, None) if self.notifying else None
+            if batch is None:
+                self._transfer = None
+                self._timer = None
+                return False
+            self.PropertiesChanged(GATT_CHRC_IFACE,
+                                   {"Value": to_dbus_bytes(batch)}, [])
+        return True
+
+    def _stop_transfer(self):
+        self._transfer = None
+        if self._timer:
+            self.remove_timeout(self._timer)
+            self._timer = None
+
+    def WriteValue(self, value, options):
+        data = bytes(value)
+        if not data:
+            raise InvalidArgsException()
+
+        opcode = data[0]
+        if opcode == HISTORY_ABORT:
+            self._stop_transfer()
+            return
+
+        if opcode == HISTORY_ALL:
+            since = None
+        elif opcode == HISTORY_SINCE and len(data) >= HISTORY_SINCE_REQ.size:
+            since = HISTORY_SINCE_REQ.unpack_from(data)[1]
+        else:
+            raise InvalidArgsException()
+
+        mtu = int(options.get("mtu", DEFAULT_MTU))
+        self._start_transfer(self._records_since(since), mtu)
+
+    def StartNotify(self):
+        self.notifying = True
+
+    def StopNotify(self):
+        self.notifying = False
+        self._stop_transfer()
+
+    def ReadValue(self, options):
+        records = list(self._records)
+        oldest = records[0][0] if records else 0
+        newest = records[-1][0] if records else 0
+        return to_dbus_bytes(HISTORY_STATUS.pack(len(records), oldest, newest))
+
+class HistoryDescriptor(Descriptor):
+    HISTORY_DESCRIPTOR_UUID = "2901"
+    HISTORY_DESCRIPTOR_VALUE = "History (write 0x01 all, 0x02 + seq u16 since)"
+
+    def __init__(self, characteristic):
+        Descriptor.__init__(
+            self, self.HISTORY_DESCRIPTOR_UUID,
+            ["read"],
+            characteristic)
+
+    def ReadValue(self, options):
+        value = []
+        desc = self.HISTORY_DESCRIPTOR_VALUE
+        for c in desc:
+            value.append(dbus.Byte(c.encode()))
+        return value
+
 # Remove the standalone application code since we're integrating with main.py
\ No newline at end of file
@@ -89,20 +89,42 @@ class Application(dbus.service.Object):
     def register_app_error_callback(self, error):
         print("Failed to register application: " + str(error))
 
-    def register(self):
+    def register(self, on_registered=None, on_error=None):
+        """
+        Register with BlueZ, returns without waiting for the reply
+
+        Args:
+            on_registered: Optional callback run in the mainloop once
+                BlueZ accepted the application
+            on_error: Optional callback(error) run if it was rejected
+        """
         adapter = BleTools.find_adapter(self.bus)
 
         service_manager = dbus.Interface(
                 self.bus.get_object(BLUEZ_SERVICE_NAME, adapter),
                 GATT_MANAGER_IFACE)
 
+        def reply():
+            self.register_app_callback()
+            if on_registered:
+                on_registered()
+
+        def error(e):
+            self.register_app_error_callback(e)
+            if on_error:
+                on_error(e)
+
         service_manager.RegisterApplication(self.get_path(), {},
-                reply_handler=self.register_app_callback,
-                error_handler=self.register_app_error_callback)
+                reply_handler=reply,
+                error_handler=error)
 
     def run(self):
         self.mainloop.run()
 
+    def idle_add(self, callback, *args):
+        """Run callback in the mainloop thread, safe to call from any thread"""
+        return GObject.idle_add(callback, *args)
+
     def quit(self):
         #print("\nGATT application terminated")
         self.mainloop.quit()
@@ -253,7 +275,10 @@ class Characteristic(dbus.service.Object):
         return idx
 
     def add_timeout(self, timeout, callback):
-        GObject.timeout_add(timeout, callback)
+        return GObject.timeout_add(timeout, callback)
+
+    def remove_timeout(self, source_id):
+        GObject.source_remove(source_id)
 
 
 class Descriptor(dbus.service.Object):
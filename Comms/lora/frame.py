@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Binary frame format for the LoRa link
+
+Every frame is a fixed header, a typed payload and a CRC:
+
+    magic    u8   0xBA
+    ver_type u8   version in the high nibble, low nibble is the ACK
+                  request flag (bit 3) and the frame type (bits 0-2)
+    device   u8   sender id
+    seq      u16  per-sender sequence number
+    length   u8   payload length
+    payload       see below
+    crc      u16  CRC-CCITT over header and payload
+
+Health payload: ts u32 (unix seconds), hr i16, spo2 i8 (-1 = no reading)
+Alert payload:  ts u32, alert type and message as UTF-8 separated by NUL
+Raw payload:    arbitrary bytes passed to LoRaModule.send()
+ACK payload:    acked seq u16, bitmap u32 where bit i acks seq - 1 - i;
+                the device field names the sender being acknowledged
+
+All fields are little-endian. A health frame is 15 bytes against about
+70 for the JSON packet it replaces. Older senders still write that JSON
+packet without framing, FrameParser(keep_text=True) picks it out of the
+stream.
+"""
+
+import json
+import struct
+import time
+from binascii import crc_hqx
+
+MAGIC = 0xBA
+VERSION = 1
+
+TYPE_HEALTH = 0x1
+TYPE_ALERT = 0x2
+TYPE_ACK = 0x3
+TYPE_RAW = 0x7
+TYPE_MASK = 0x7
+FLAG_ACK_REQ = 0x8
+ACK_BITMAP_BITS = 32
+
+HEADER = struct.Struct("<BBBHB")
+HEALTH = struct.Struct("<Ihb")
+ALERT = struct.Struct("<I")
+ACK = struct.Struct("<HI")
+CRC = struct.Struct("<H")
+
+HEADER_SIZE = HEADER.size
+CRC_SIZE = CRC.size
+MAX_PAYLOAD = 255
+HEALTH_FRAME_SIZE = HEADER_SIZE + HEALTH.size + CRC_SIZE
+
+_JSON = json.JSONDecoder()
+
+
+class FrameError(ValueError):
+    """Raised when bytes are not a valid frame"""
+
+
+def device_code(device_id):
+    """
+    Map a device id to the one byte carried in frames
+
+    Numeric ids ("01") keep their value, other names are hashed.
+    """
+    if isinstance(device_id, int):
+        return device_id & 0xFF
+    if str(device_id).isdigit():
+        return int(device_id) & 0xFF
+    return crc_hqx(str(device_id).encode("utf-8"), 0xFFFF) & 0xFF
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, int(value)))
+
+
+def _frame(frame_type, device, seq, payload, ack_req=False):
+    if len(payload) > MAX_PAYLOAD:
+        raise FrameError(f"payload too long: {len(payload)} bytes")
+
+    if ack_req:
+        frame_type |= FLAG_ACK_REQ
+    body = HEADER.pack(MAGIC, VERSION << 4 | frame_type,
+                       device, seq & 0xFFFF, len(payload)) + payload
+    return body + CRC.pack(crc_hqx(body, 0xFFFF))
+
+
+def encode_health(device, seq, heart_rate, spo2, timestamp=None,
+                  ack_req=False):
+    """
+    Build a health data frame
+
+    Args:
+        device: Device code from device_code()
+        seq: Sequence number, wrapped to 16 bits
+        heart_rate: Heart rate in BPM (-1 for no reading)
+        spo2: Blood oxygen percentage (-1 for no reading)
+        timestamp: Unix timestamp (auto-generated if None)
+        ack_req: Ask the receiver to acknowledge the frame
+
+    Returns:
+        bytes: Encoded frame
+    """
+    if timestamp is None:
+        timestamp = time.time()
+
+    payload = HEALTH.pack(int(timestamp) & 0xFFFFFFFF,
+                          _clamp(heart_rate, -1, 0x7FFF),
+                          _clamp(spo2, -1, 0x7F))
+    return _frame(TYPE_HEALTH, device, seq, payload, ack_req)
+
+
+def encode_alert(device, seq, alert_type, message, timestamp=None,
+                 ack_req=False):
+    """
+    Build an alert frame, the message is truncated to fit one frame
+
+    Returns:
+        bytes: Encoded frame
+    """
+    if timestamp is None:
+        timestamp = time.time()
+
+    text = alert_type.encode("utf-8") + b"\0" + message.encode("utf-8")
+    payload = ALERT.pack(int(timestamp) & 0xFFFFFFFF) + text
+    return _frame(TYPE_ALERT, device, seq, payload[:MAX_PAYLOAD], ack_req)
+
+
+def encode_ack(device, seq, bitmap=0):
+    """
+    Build an acknowledgement
+
+    Args:
+        device: Code of the sender being acknowledged
+        seq: Sequence number being acknowledged
+        bitmap: Earlier frames also received, bit i is seq - 1 - i
+    """
+    payload = ACK.pack(seq & 0xFFFF, bitmap & 0xFFFFFFFF)
+    return _frame(TYPE_ACK, device, 0, payload)
+
+
+def acked_seqs(ack):
+    """All sequence numbers covered by a decoded ACK"""
+    seqs = [ack["ack"]]
+    for i in range(ACK_BITMAP_BITS):
+        if ack["bitmap"] >> i & 1:
+            seqs.append((ack["ack"] - 1 - i) & 0xFFFF)
+    return seqs
+
+
+def encode_raw(data, device=0, seq=0):
+    """Wrap arbitrary bytes so they can be delimited on the stream"""
+    return _frame(TYPE_RAW, device, seq, bytes(data))
+
+
+def decode(frame):
+    """
+    Decode one complete frame
+
+    Args:
+        frame: bytes-like object holding exactly one frame
+
+    Returns:
+        dict: Same fields as the JSON packets ("ts", "hr", "spo2", "dev"
+        or "type", "alert_type", "msg", "ts", "dev") plus "seq" and
+        "ack_req", or "type" "ack"/"raw" for protocol frames
+
+    Raises:
+        FrameError: If the bytes are not a valid frame
+    """
+    frame = bytes(frame)
+    if len(frame) < HEADER_SIZE + CRC_SIZE:
+        raise FrameError("frame too short")
+
+    magic, ver_type, device, seq, length = HEADER.unpack_from(frame)
+    if magic != MAGIC:
+        raise FrameError("bad magic")
+    if ver_type >> 4 != VERSION:
+        raise FrameError(f"unsupported version {ver_type >> 4}")
+    if len(frame) != HEADER_SIZE + length + CRC_SIZE:
+        raise FrameError("length mismatch")
+
+    (crc,) = CRC.unpack_from(frame, HEADER_SIZE + length)
+    if crc != crc_hqx(frame[:HEADER_SIZE + length], 0xFFFF):
+        raise FrameError("bad CRC")
+
+    frame_type = ver_type & TYPE_MASK
+    ack_req = bool(ver_type & FLAG_ACK_REQ)
+    payload = frame[HEADER_SIZE:HEADER_SIZE + length]
+
+    if frame_type == TYPE_HEALTH:
+        ts, hr, spo2 = HEALTH.unpack(payload)
+        return {"ts": ts, "hr": hr, "spo2": spo2, "dev": device, "seq": seq,
+                "ack_req": ack_req}
+
+    if frame_type == TYPE_ALERT:
+        (ts,) = ALERT.unpack_from(payload)
+        alert_type, _, msg = payload[ALERT.size:].partition(b"\0")
+        return {
+            "type": "alert",
+            "alert_type": alert_type.decode("utf-8", "replace"),
+            "msg": msg.decode("utf-8", "replace"),
+            "ts": ts,
+            "dev": device,
+            "seq": seq,
+            "ack_req": ack_req
+        }
+
+    if frame_type == TYPE_ACK:
+        acked, bitmap = ACK.unpack(payload)
+        return {"type": "ack", "ack": acked, "bitmap": bitmap, "dev": device}
+
+    if frame_type == TYPE_RAW:
+        return {"type": "raw", "data": payload, "dev": device, "seq": seq}
+
+    raise FrameError(f"unknown frame type {frame_type}")
+
+
+def _json_prefix(data):
+    """
+    Internal: The JSON object at the start of data as str, "" if there
+    is none, None if the bytes so far may still become one
+    """
+    try:
+        text, invalid = data.decode("utf-8"), False
+    except UnicodeDecodeError as e:
+        text = data[:e.start].decode("utf-8")
+        invalid = e.reason != "unexpected end of data"
+
+    try:
+        return text[:_JSON.raw_decode(text)[1]]
+    except json.JSONDecodeError as e:
+        truncated = (e.pos >= len(text)
+                     or e.msg.startswith("Unterminated string"))
+        return None if truncated and not invalid else ""
+
+
+class FrameParser:
+    """
+    Incremental parser that turns a UART byte stream into frames
+
+    Bytes are appended to one reusable buffer. feed() returns only
+    complete frames with a valid CRC, so a frame split over several
+    reads is joined and several frames in one read are separated.
+    Garbage is skipped by resyncing on the next magic byte.
+
+    With keep_text the skipped bytes are also searched for the plain
+    JSON packets older senders write without framing, and every
+    complete JSON object is returned as a str in stream order.
+    """
+
+    def __init__(self, max_buffer=4096, keep_text=False, max_text=512):
+        self.max_buffer = max_buffer
+        self.keep_text = keep_text
+        self.max_text = max_text
+        self.dropped = 0
+        self._buf = bytearray()
+        self._text = bytearray()
+
+    def feed(self, data):
+        """
+        Add received bytes
+
+        Returns:
+            list: Complete frames as bytes, with keep_text also plain
+            JSON packets as str
+        """
+        buf = self._buf
+        buf += data
+        frames = []
+        pos = 0
+
+        with memoryview(buf) as view:
+            while True:
+                start = buf.find(MAGIC, pos)
+                if start < 0:
+                    self._skip(view[pos:], frames)
+                    pos = len(buf)
+                    break
+                self._skip(view[pos:start], frames)
+                if len(buf) - start < HEADER_SIZE:
+                    pos = start
+                    break
+
+                if buf[start + 1] >> 4 != VERSION:
+                    # Stray magic byte, do not wait for its bogus length
+                    self._skip(view[start:start + 1], frames)
+                    pos = start + 1
+                    continue
+
+                end = start + HEADER_SIZE + buf[start + 5] + CRC_SIZE
+                if len(buf) < end:
+                    pos = start
+                    break
+
+                (crc,) = CRC.unpack_from(buf, end - CRC_SIZE)
+                if crc == crc_hqx(view[start:end - CRC_SIZE], 0xFFFF):
+                    frames.append(bytes(view[start:end]))
+                    pos = end
+                else:
+                    self.dropped += 1
+                    self._skip(view[start:start + 1], frames)
+                    pos = start + 1
+
+        del buf[:pos]
+        if len(buf) > self.max_buffer:
+            self.dropped += 1
+            del buf[:-HEADER_SIZE]
+        return frames
+
+    def _skip(self, data, out):
+        """Internal: Search bytes that are not part of a frame for JSON"""
+        if not self.keep_text or not data:
+            return
+        text = self._text
+        text += data
+
+        while True:
+            start = text.find(b"{")
+            if start < 0:
+                text.clear()
+                return
+            del text[:start]
+
+            packet = _json_prefix(text)
+            if packet:
+                out.append(packet)
+                del text[:len(packet.encode("utf-8"))]
+            elif packet is None and len(text) <= self.max_text:
+                return  # Wait for the rest of the packet
+            else:
+                if packet is None:
+                    self.dropped += 1
+                del text[:1]
+
+    def reset(self):
+        self._buf.clear()
+        self._text.clear()
@@ -9,8 +9,12 @@ import serial
 import time
 import json
 import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
 from queue import Queue, Empty
 
+from Comms.lora import frame
+
 
 class LoRaModule:
     """
@@ -18,29 +22,54 @@ class LoRaModule:
     Handles transparent UART communication with DX-LR02-900T22D
     """
     
+    # AUX timeouts in a row before a chunk is dropped, or before AUX is
+    # treated as unwired if it was never seen idle
+    AUX_MAX_MISSES = 3
+    # Longest a mode switch takes, used as is if AUX never rises
+    MODE_SWITCH_TIMEOUT = 0.1
+    # AUX falls within this long of a mode change, if it changes the mode
+    MODE_SWITCH_MIN = 0.01
+    # The module takes commands this long after AUX went high
+    AUX_SETTLE = 0.002
+    # Also accept the unframed JSON packets written by older senders
+    LEGACY_JSON = False
+
     def __init__(self, m0_pin=25, m1_pin=23, aux_pin=24, 
-                 port='/dev/serial0', baud=9600):
+                 port='/dev/serial0', baud=9600, tx_buffer=512,
+                 aux_timeout=2.0):
         """
         Initialize LoRa module
         
         Args:
             m0_pin: GPIO pin for M0 (mode select bit 0)
             m1_pin: GPIO pin for M1 (mode select bit 1)  
-            aux_pin: GPIO pin for AUX (optional, not used if not connected)
+            aux_pin: GPIO pin for AUX (high when the module is idle,
+                a fixed delay is used if it is not connected)
             port: UART device path
             baud: Baud rate (module default is 9600)
+            tx_buffer: Module TX buffer size, no write is larger than this
+            aux_timeout: Seconds to wait for AUX to report idle
         """
         self.m0_pin = m0_pin
         self.m1_pin = m1_pin
         self.aux_pin = aux_pin
         self.port = port
         self.baud = baud
+        self.tx_buffer = tx_buffer
+        self.aux_timeout = aux_timeout
+
+        self._aux_idle = threading.Event()
+        self._aux_events = False
+        # AUX was seen high at least once, so it is wired
+        self._aux_seen = False
         
         self.ser = None
         self.tx_queue = Queue()
         self.rx_queue = Queue()
         self.running = False
-        self.lock = threading.Lock()
+        # TX and RX are serialized separately so they never block each other
+        self.tx_lock = threading.Lock()
+        self.rx_lock = threading.Lock()
         self._threads = []
         
         self._setup_gpio()
@@ -53,12 +82,71 @@ class LoRaModule:
         GPIO.setup(self.m1_pin, GPIO.OUT)
         GPIO.setup(self.aux_pin, GPIO.IN)
         self._set_normal_mode()
+
+        # Pace TX on AUX edges instead of a guessed delay
+        try:
+            GPIO.add_event_detect(self.aux_pin, GPIO.BOTH,
+                                  callback=self._on_aux_edge)
+            self._aux_events = True
+            self._on_aux_edge(self.aux_pin)
+        except Exception as e:
+            print(f"[LoRa] AUX edge detection unavailable: {e}")
+
+    def _on_aux_edge(self, channel):
+        """Internal: AUX goes low while the module is busy, high when idle"""
+        if GPIO.input(self.aux_pin) == GPIO.HIGH:
+            self._aux_seen = True
+            self._aux_idle.set()
+        else:
+            self._aux_idle.clear()
+
+    def _wait_aux_idle(self):
+        """
+        Internal: Block until the module buffer is free
+
+        Returns:
+            bool: False if the module stayed busy, nothing may be written
+        """
+        if not self._aux_events:
+            time.sleep(0.05)  # Brief delay for module readiness
+            return True
+
+        for _ in range(self.AUX_MAX_MISSES):
+            # A missed edge is caught by reading the pin level
+            if (self._aux_idle.wait(self.aux_timeout)
+                    or GPIO.input(self.aux_pin) == GPIO.HIGH):
+                self._aux_seen = True
+                self._aux_idle.set()
+                return True
+            if not self.running:
+                return False
+
+        if not self._aux_seen:
+            # Never idle since start, the pin is not connected
+            print("[LoRa] AUX never reports idle, using fixed TX delay")
+            self._aux_events = False
+            return True
+        return False
         
     def _set_normal_mode(self):
         """Set module to transparent transmission mode (M1=0, M0=0)"""
         GPIO.output(self.m1_pin, GPIO.LOW)
         GPIO.output(self.m0_pin, GPIO.LOW)
-        time.sleep(0.1)
+
+        # AUX drops while the module switches. HIGH only means ready once
+        # it fell, or once it had time to fall and stayed up because the
+        # module already was in this mode
+        start = time.monotonic()
+        deadline = start + self.MODE_SWITCH_TIMEOUT
+        switching = False
+        while time.monotonic() < deadline:
+            if GPIO.input(self.aux_pin) == GPIO.LOW:
+                switching = True
+            elif (switching or
+                    time.monotonic() - start >= self.MODE_SWITCH_MIN):
+                time.sleep(self.AUX_SETTLE)
+                return
+            time.sleep(0.001)
         
     def connect(self):
         """
@@ -74,7 +162,7 @@ class LoRaModule:
                 bytesize=serial.EIGHTBITS,
                 parity=serial.PARITY_NONE,
                 stopbits=serial.STOPBITS_ONE,
-                timeout=0.1
+                timeout=0.5  # RX blocks in select() up to this long
             )
             self.running = True
             
@@ -108,11 +196,24 @@ class LoRaModule:
         Queue data for transmission
         
         Args:
-            data: String or dictionary (dict will be JSON-encoded)
+            data: Encoded frame (bytes, sent as-is), string or dictionary
+                (dict will be JSON-encoded), strings are wrapped in a raw
+                frame so the receiver can delimit them
+
+        Returns:
+            bool: True if queued, False if the string does not fit in
+            one frame (frame.MAX_PAYLOAD bytes)
         """
         if isinstance(data, dict):
             data = json.dumps(data)
-        self.tx_queue.put(str(data))
+        if not isinstance(data, (bytes, bytearray)):
+            try:
+                data = frame.encode_raw(str(data).encode('utf-8'))
+            except frame.FrameError as e:
+                print(f"[LoRa] Not sent, {e}")
+                return False
+        self.tx_queue.put(bytes(data))
+        return True
         
     def get_messages(self, clear=True):
         """
@@ -122,7 +223,8 @@ class LoRaModule:
             clear: If True, removes messages from queue (default)
             
         Returns:
-            list: Received messages as strings
+            list: Received frames as bytes, with LEGACY_JSON also
+            unframed JSON packets as str
         """
         messages = []
         while not self.rx_queue.empty():
@@ -136,10 +238,16 @@ class LoRaModule:
         while self.running:
             try:
                 message = self.tx_queue.get(timeout=0.1)
-                with self.lock:
-                    time.sleep(0.05)  # Brief delay for module readiness
-                    self.ser.write(message.encode('utf-8'))
-                    self.ser.flush()
+                with self.tx_lock:
+                    for start in range(0, len(message), self.tx_buffer):
+                        if not self._wait_aux_idle():
+                            print("[LoRa] Module still busy, dropping frame")
+                            break
+                        # Busy until the AUX rising edge says the buffer is
+                        # free. Cleared before writing so that edge is never lost
+                        self._aux_idle.clear()
+                        self.ser.write(message[start:start + self.tx_buffer])
+                        self.ser.flush()
             except Empty:
                 continue
             except Exception as e:
@@ -147,62 +255,225 @@ class LoRaModule:
                 
     def _rx_worker(self):
         """Internal: Background receiver thread"""
+        parser = frame.FrameParser(keep_text=self.LEGACY_JSON)
         while self.running:
             try:
-                with self.lock:
-                    if self.ser.in_waiting > 0:
-                        data = self.ser.read(self.ser.in_waiting)
-                        try:
-                            text = data.decode('utf-8')
-                            self.rx_queue.put(text)
-                        except UnicodeDecodeError:
-                            self.rx_queue.put(f"[HEX]{data.hex()}")
-                time.sleep(0.01)
+                with self.rx_lock:
+                    # Sleeps in select() until bytes arrive or the timeout
+                    data = self.ser.read(self.ser.in_waiting or 1)
+                if data:
+                    for received in parser.feed(data):
+                        self._on_frame(received)
             except Exception as e:
                 print(f"[LoRa RX Error] {e}")
+                time.sleep(0.1)
+
+    def _on_frame(self, data):
+        """Internal: Called by the RX thread for every complete frame"""
+        self.rx_queue.put(data)
 
 
 class LoRaHealthSender(LoRaModule):
     """
     Specialized class for sending health sensor data
     Extends base LoRaModule with health-specific formatting
+
+    In reliable mode every frame asks for an ACK. Up to `window` frames
+    are in flight at once, unacknowledged frames are retransmitted with
+    a doubling timeout, and the Future returned for each frame resolves
+    to True on delivery or False once it is given up.
     """
     
-    def __init__(self, device_id="pi_zero_health", **kwargs):
+    def __init__(self, device_id="pi_zero_health", reliable=False, window=4,
+                 ack_timeout=3.0, max_retries=3, **kwargs):
         """
         Initialize health sender
         
         Args:
             device_id: Unique identifier for this device
+            reliable: Request ACKs from the receiver and retransmit
+            window: Frames in flight before new frames wait
+            ack_timeout: Seconds before the first retransmission,
+                doubled on every retry
+            max_retries: Retransmissions before a frame counts as lost
             **kwargs: Passed to parent LoRaModule (pins, port, etc.)
         """
         super().__init__(**kwargs)
         self.device_id = device_id
+        self.device_code = frame.device_code(device_id)
+        self._seq = 0
+        self._seq_lock = threading.Lock()
+
+        self.reliable = reliable
+        self.window = window
+        self.ack_timeout = ack_timeout
+        self.max_retries = max_retries
+        self.delivered = 0
+        self.lost = 0
+        self.retransmissions = 0
+
+        self._inflight = {}
+        self._waiting = deque()
+        self._arq_lock = threading.Lock()
+        self._arq_wakeup = threading.Event()
+
+    def connect(self):
+        """
+        Open serial connection and start worker threads
         
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if not super().connect():
+            return False
+
+        if self.reliable:
+            retx = threading.Thread(target=self._retx_worker, daemon=True)
+            self._threads.append(retx)
+            retx.start()
+        return True
+
+    def disconnect(self):
+        """Stop threads and fail frames that were never acknowledged"""
+        super().disconnect()
+
+        with self._arq_lock:
+            pending = list(self._inflight.values()) + list(self._waiting)
+            self._inflight.clear()
+            self._waiting.clear()
+        for entry in pending:
+            entry["future"].set_result(False)
+
+    def _next_seq(self):
+        with self._seq_lock:
+            seq = self._seq
+            self._seq = (self._seq + 1) & 0xFFFF
+        return seq
+
+    # ------------------------------
+    # ACKNOWLEDGED DELIVERY
+    # ------------------------------
+    def _send_frame(self, seq, data):
+        """Internal: Queue a frame, returns a Future for its delivery"""
+        future = Future()
+        if not self.reliable:
+            self.send(data)
+            future.set_result(True)
+            return future
+
+        entry = {"seq": seq, "frame": data, "future": future,
+                 "retries": 0, "deadline": 0.0}
+        with self._arq_lock:
+            if len(self._inflight) < self.window:
+                self._transmit_entry(entry)
+            else:
+                self._waiting.append(entry)
+        return future
+
+    def _transmit_entry(self, entry):
+        """Internal: (Re)send a tracked frame, caller holds _arq_lock"""
+        timeout = self.ack_timeout * 2 ** entry["retries"]
+        entry["deadline"] = time.monotonic() + timeout
+        self._inflight[entry["seq"]] = entry
+        self.send(entry["frame"])
+        self._arq_wakeup.set()
+
+    def _fill_window(self):
+        """Internal: Move waiting frames into the window, caller holds _arq_lock"""
+        while self._waiting and len(self._inflight) < self.window:
+            self._transmit_entry(self._waiting.popleft())
+
+    def _on_frame(self, data):
+        """Internal: Consume ACKs addressed to this sender"""
+        if (data[1] & frame.TYPE_MASK) == frame.TYPE_ACK:
+            try:
+                ack = frame.decode(data)
+            except frame.FrameError:
+                return
+            if ack["dev"] == self.device_code:
+                self._handle_ack(ack)
+            return
+
+        super()._on_frame(data)
+
+    def _handle_ack(self, ack):
+        done = []
+        with self._arq_lock:
+            for seq in frame.acked_seqs(ack):
+                entry = self._inflight.pop(seq, None)
+                if entry:
+                    done.append(entry)
+            self._fill_window()
+
+        self.delivered += len(done)
+        for entry in done:
+            entry["future"].set_result(True)
+
+    def _retx_worker(self):
+        """Internal: Retransmit frames whose ACK timed out"""
+        while self.running:
+            lost = []
+            with self._arq_lock:
+                now = time.monotonic()
+                for entry in list(self._inflight.values()):
+                    if entry["deadline"] > now:
+                        continue
+                    if entry["retries"] >= self.max_retries:
+                        del self._inflight[entry["seq"]]
+                        lost.append(entry)
+                    else:
+                        entry["retries"] += 1
+                        self.retransmissions += 1
+                        self._transmit_entry(entry)
+                self._fill_window()
+                deadlines = [e["deadline"] for e in self._inflight.values()]
+                self._arq_wakeup.clear()
+
+            self.lost += len(lost)
+            for entry in lost:
+                entry["future"].set_result(False)
+
+            timeout = min(deadlines) - time.monotonic() if deadlines else 0.5
+            self._arq_wakeup.wait(max(0.01, min(timeout, 0.5)))
+
+    # ------------------------------
+    # HEALTH DATA
+    # ------------------------------
     def send_health_data(self, heart_rate, spo2, timestamp=None, extra=None):
         """
-        Send health sensor data as JSON packet
+        Send health sensor data as a binary frame
         
         Args:
             heart_rate: Heart rate in BPM
             spo2: Blood oxygen percentage
             timestamp: Unix timestamp (auto-generated if None)
-            extra: Optional dict with additional fields
+            extra: Optional dict with additional fields, the frame has no
+                room for them so the reading is sent as a JSON packet instead,
+                unacknowledged and only if it fits in one frame
+
+        Returns:
+            Future: Resolves to True once delivered (on queueing when
+            not in reliable mode), False if the frame was lost or too long
         """
         if timestamp is None:
             timestamp = time.time()
-            
-        packet = {
-            "ts": timestamp,
-            "hr": heart_rate,
-            "spo2": spo2,
-            "dev": self.device_id
-        }
-        
+
         if extra and isinstance(extra, dict):
+            packet = {
+                "ts": timestamp,
+                "hr": heart_rate,
+                "spo2": spo2,
+                "dev": self.device_id
+            }
             packet.update(extra)
-            
-        self.send(packet)
+            future = Future()
+            future.set_result(self.send(packet))
+            return future
+
+        seq = self._next_seq()
+        return self._send_frame(seq, frame.encode_health(
+            self.device_code, seq, heart_rate, spo2, timestamp,
+            ack_req=self.reliable))
         
     def send_alert(self, alert_type, message):
         """
@@ -211,24 +482,33 @@ class LoRaHealthSender(LoRaModule):
         Args:
             alert_type: Type of alert (e.g., "high_hr", "low_spo2")
             message: Human-readable alert message
+
+        Returns:
+            Future: Same as send_health_data()
         """
-        packet = {
-            "type": "alert",
-            "alert_type": alert_type,
-            "msg": message,
-            "ts": time.time(),
-            "dev": self.device_id
-        }
-        self.send(packet)
+        seq = self._next_seq()
+        return self._send_frame(seq, frame.encode_alert(
+            self.device_code, seq, alert_type, message,
+            ack_req=self.reliable))
 
 
 class LoRaReceiver(LoRaModule):
     """
     Specialized class for receiving and processing data
     Extends base LoRaModule with parsing capabilities
+
+    Frames that request it are acknowledged straight from the RX thread
+    with a selective ACK, and retransmitted duplicates are dropped.
+    Plain JSON packets from senders that predate the binary frames are
+    still accepted.
     """
+
+    # Sequence numbers remembered per sender for duplicate suppression
+    DEDUP_WINDOW = 64
+    LEGACY_JSON = True
     
-    def __init__(self, on_health_data=None, on_alert=None, on_raw=None, **kwargs):
+    def __init__(self, on_health_data=None, on_alert=None, on_raw=None,
+                 send_acks=True, **kwargs):
         """
         Initialize receiver with callbacks
         
@@ -236,12 +516,49 @@ class LoRaReceiver(LoRaModule):
             on_health_data: Function to call when health data received
             on_alert: Function to call when alert received  
             on_raw: Function to call for any raw message
+            send_acks: Acknowledge frames that request it
             **kwargs: Passed to parent LoRaModule
         """
         super().__init__(**kwargs)
         self.on_health_data = on_health_data
         self.on_alert = on_alert
         self.on_raw = on_raw
+        self.send_acks = send_acks
+        self.duplicates = 0
+        self._seen = {}
+
+    def _on_frame(self, data):
+        """Internal: Acknowledge and deduplicate frames that ask for an ACK"""
+        if isinstance(data, str) or not data[1] & frame.FLAG_ACK_REQ:
+            super()._on_frame(data)
+            return
+
+        header = frame.HEADER.unpack_from(data)
+        device, seq = header[2], header[3]
+        crc = bytes(data[-frame.CRC_SIZE:])
+
+        seen = self._seen.setdefault(device, OrderedDict())
+        # Same seq and CRC is a retransmission, a restarted sender differs
+        duplicate = seen.get(seq) == crc
+        seen[seq] = crc
+        seen.move_to_end(seq)
+        while len(seen) > self.DEDUP_WINDOW:
+            seen.popitem(last=False)
+
+        if self.send_acks:
+            self.send(frame.encode_ack(device, seq, self._ack_bitmap(seen, seq)))
+
+        if duplicate:
+            self.duplicates += 1
+            return
+        super()._on_frame(data)
+
+    def _ack_bitmap(self, seen, seq):
+        bitmap = 0
+        for i in range(frame.ACK_BITMAP_BITS):
+            if (seq - 1 - i) & 0xFFFF in seen:
+                bitmap |= 1 << i
+        return bitmap
         
     def process_messages(self):
         """
@@ -255,15 +572,26 @@ class LoRaReceiver(LoRaModule):
             if self.on_raw:
                 self.on_raw(msg)
                 
-            # Try to parse as JSON
-            try:
+            if isinstance(msg, str):
+                # Unframed JSON packet from an older sender
                 data = json.loads(msg)
-                
-                if data.get("type") == "alert" and self.on_alert:
-                    self.on_alert(data)
-                elif "hr" in data and self.on_health_data:
-                    self.on_health_data(data)
-                    
-            except json.JSONDecodeError:
-                # Not JSON, already handled by on_raw
-                pass
\ No newline at end of file
+            else:
+                try:
+                    data = frame.decode(msg)
+                except frame.FrameError:
+                    continue
+
+                if data.get("type") == "raw":
+                    # Payload from send(), try to parse as JSON
+                    try:
+                        data = json.loads(data["data"].decode('utf-8'))
+                    except (UnicodeDecodeError, json.JSONDecodeError):
+                        # Not JSON, already handled by on_raw
+                        continue
+            if not isinstance(data, dict):
+                continue
+
+            if data.get("type") == "alert" and self.on_alert:
+                self.on_alert(data)
+            elif "hr" in data and self.on_health_data:
+                self.on_health_data(data)
\ No newline at end of file
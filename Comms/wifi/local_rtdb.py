@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Firebase Realtime Database REST API
+
+Speaks the subset firebase_admin.db uses: GET, PUT, PATCH (including
+multi-path updates), POST and DELETE on <path>.json, with the database
+picked by the ?ns= parameter. Point firebase_admin at it with
+
+    FIREBASE_DATABASE_EMULATOR_HOST=localhost:9000
+
+and a databaseURL such as http://localhost:9000?ns=ban-net. Every
+request can be delayed (latency plus random jitter) or failed with a
+503 to see how the WIFI transport behaves on a slow or flaky link.
+
+Usage:
+    python3 -m Comms.wifi.local_rtdb --port 9000 --latency-ms 80 \\
+        --jitter-ms 20 --error-rate 0.05
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def _split(path):
+    return [part for part in path.strip("/").split("/") if part]
+
+
+class LocalRTDB:
+    """
+    In-memory JSON tree per namespace behind a threaded HTTP server
+
+    Counts requests per method so benchmarks can report how many round
+    trips a transport needed.
+    """
+
+    def __init__(self, host="127.0.0.1", port=9000, latency=0.0, jitter=0.0,
+                 error_rate=0.0, seed=None):
+        """
+        Initialize stand-in
+
+        Args:
+            host: Address to listen on
+            port: Port to listen on, 0 picks a free one
+            latency: Seconds added to every request
+            jitter: Standard deviation in seconds of extra random delay
+            error_rate: Fraction of requests answered with a 503
+            seed: Seed for the delay and error randomness
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+        self.data = {}
+        self.requests = {}
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._push_id = 0
+
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def host(self):
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = {}
+            self.errors = 0
+
+    # ------------------------------
+    # JSON TREE
+    # ------------------------------
+    def get(self, ns, path):
+        with self._lock:
+            node = self.data.get(ns)
+            for key in _split(path):
+                if not isinstance(node, dict) or key not in node:
+                    return None
+                node = node[key]
+            return node
+
+    def _set(self, ns, parts, value):
+        """Set or delete (value None) one node, caller holds the lock"""
+        if not parts:
+            if value is None:
+                self.data.pop(ns, None)
+            else:
+                self.data[ns] = value
+            return
+
+        node = self.data.setdefault(ns, {})
+        if not isinstance(node, dict):
+            node = self.data[ns] = {}
+        for key in parts[:-1]:
+            child = node.get(key)
+            if not isinstance(child, dict):
+                child = node[key] = {}
+            node = child
+
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = value
+
+    def put(self, ns, path, value):
+        with self._lock:
+            self._set(ns, _split(path), value)
+
+    def patch(self, ns, path, values):
+        """Multi-path update, every key may itself be a path"""
+        base = _split(path)
+        with self._lock:
+            for key, value in values.items():
+                self._set(ns, base + _split(key), value)
+
+    def push(self, ns, path, value):
+        with self._lock:
+            self._push_id += 1
+            key = f"-local{int(time.time() * 1000):013d}{self._push_id:06d}"
+            self._set(ns, _split(path) + [key], value)
+        return key
+
+    # ------------------------------
+    # HTTP
+    # ------------------------------
+    def _delay_or_fail(self):
+        """Apply latency, returns False if this request should fail"""
+        with self._lock:
+            delay = self.latency + (self.random.gauss(0, self.jitter)
+                                    if self.jitter else 0.0)
+            fail = self.random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+        return not fail
+
+    def _count(self, method):
+        with self._lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+
+    def _handler(self):
+        rtdb = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status, body=None):
+                payload = b"" if status == 204 else json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _handle(self, method):
+                rtdb._count(method)
+                url = urlsplit(self.path)
+                query = parse_qs(url.query)
+                ns = query.get("ns", ["default"])[0]
+                silent = query.get("print", [""])[0] == "silent"
+
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+
+                if not url.path.endswith(".json"):
+                    self._reply(404, {"error": "path must end with .json"})
+                    return
+                path = url.path[:-len(".json")]
+
+                if not rtdb._delay_or_fail():
+                    with rtdb._lock:
+                        rtdb.errors += 1
+                    self._reply(503, {"error": "injected failure"})
+                    return
+
+                try:
+                    body = json.loads(raw) if raw else None
+                except ValueError:
+                    self._reply(400, {"error": "invalid JSON"})
+                    return
+
+                if method == "GET":
+                    self._reply(200, rtdb.get(ns, path))
+                    return
+                if method == "PUT":
+                    rtdb.put(ns, path, body)
+                elif method == "PATCH":
+                    if not isinstance(body, dict):
+                        self._reply(400, {"error": "PATCH needs an object"})
+                        return
+                    rtdb.patch(ns, path, body)
+                elif method == "POST":
+                    self._reply(200, {"name": rtdb.push(ns, path, body)})
+                    return
+                elif method == "DELETE":
+                    rtdb.put(ns, path, None)
+                    body = None
+
+                if silent:
+                    self._reply(204)
+                else:
+                    self._reply(200, body)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_PUT(self):
+                self._handle("PUT")
+
+            def do_PATCH(self):
+                self._handle("PATCH")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def do_DELETE(self):
+                self._handle("DELETE")
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Firebase RTDB stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    rtdb = LocalRTDB(args.host, args.port, args.latency_ms / 1000.0,
+                     args.jitter_ms / 1000.0, args.error_rate)
+    print(f"[RTDB] Listening on {rtdb.host}, "
+          f"set FIREBASE_DATABASE_EMULATOR_HOST={rtdb.host}")
+    try:
+        rtdb.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        rtdb.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
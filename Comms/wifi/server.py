@@ -1,9 +1,104 @@
-from firebase_admin import credentials
-
-cred = credentials.Certificate("/home/markiano/Desktop/ban-net-firebase-adminsdk-fbsvc-07cbbce9f5.json")
-# for i in range(10):    
-#     ref = db.reference("/")
-#     ref.update({"O2" : hr +100})
-#     ref.update({"hr": hr})
-#     hr = hr + 10
-#     time.sleep(1)
+import os
+import threading
+import time
+
+# Used when neither the command line nor the environment set the URL
+DEFAULT_DATABASE_URL = "https://ban-net-default-rtdb.europe-west1.firebasedatabase.app/"
+
+
+def firebase_config(cred_path=None, database_url=None):
+    """
+    Resolve the Firebase configuration
+
+    Explicit arguments win, then FIREBASE_CREDENTIALS and
+    FIREBASE_DATABASE_URL from the environment. There is no default
+    service account.
+
+    Returns:
+        tuple: (credentials path or None, database URL)
+    """
+    return (
+        cred_path or os.environ.get("FIREBASE_CREDENTIALS"),
+        database_url or os.environ.get("FIREBASE_DATABASE_URL") or DEFAULT_DATABASE_URL
+    )
+
+
+class FirebaseConnector:
+    """
+    Initializes firebase_admin in a background thread
+
+    Importing firebase_admin and loading the service account take
+    seconds on a Pi Zero, so they run next to the BLE and LoRa setup
+    instead of before it. Until is_ready() is true the WIFI network
+    reports itself unavailable and readings go out over the other links.
+    Missing or unconfigured credentials only disable WIFI.
+    """
+
+    def __init__(self, cred_path=None, database_url=None, on_ready=None):
+        """
+        Initialize connector
+
+        Args:
+            cred_path: Service account JSON, see firebase_config()
+            database_url: Realtime Database URL, see firebase_config()
+            on_ready: Optional callback run once Firebase is initialized
+        """
+        self.cred_path, self.database_url = firebase_config(cred_path, database_url)
+        self.on_ready = on_ready
+
+        self.error = None
+        self.elapsed = None
+        self._ready = threading.Event()
+        self._done = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._connect, daemon=True)
+        self._thread.start()
+        return self
+
+    def configured(self):
+        """True if a service account or the database emulator is set"""
+        return bool(self.cred_path
+                    or os.environ.get("FIREBASE_DATABASE_EMULATOR_HOST"))
+
+    def _connect(self):
+        started = time.monotonic()
+        try:
+            emulator = os.environ.get("FIREBASE_DATABASE_EMULATOR_HOST")
+            if not self.configured():
+                # Checked first, so an unconfigured node skips the import
+                raise ValueError("no credentials, set --firebase-cred "
+                                 "or FIREBASE_CREDENTIALS")
+
+            import firebase_admin
+            from firebase_admin import credentials
+
+            if not firebase_admin._apps:
+                if emulator:
+                    # The emulator (or Comms.wifi.local_rtdb) needs no account
+                    cred = None
+                else:
+                    cred = credentials.Certificate(self.cred_path)
+                firebase_admin.initialize_app(cred, {"databaseURL": self.database_url})
+
+            self.elapsed = time.monotonic() - started
+            self._ready.set()
+            print(f"[Firebase] Ready after {self.elapsed:.2f} s")
+
+            if self.on_ready:
+                self.on_ready()
+
+        except Exception as e:
+            self.error = e
+            print(f"[Firebase] Initialization failed, WIFI disabled: {e}")
+        finally:
+            self._done.set()
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        """Wait until initialization finished, returns True if it succeeded"""
+        self._done.wait(timeout)
+        return self._ready.is_set()
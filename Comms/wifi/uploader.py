@@ -0,0 +1,159 @@
+import threading
+import time
+from concurrent.futures import Future
+
+
+class FirebaseUploader:
+    """
+    Background, batched uploader for the Firebase Realtime Database
+
+    Readings are queued by submit() and written by one worker thread.
+    Everything that is pending when the worker wakes up goes out in a
+    single multi-path update: one child per reading under
+    devices/<device_id>/readings, plus the root "hr"/"O2" values the
+    dashboard shows. A backlog of n readings costs one request per
+    max_batch instead of n. The database reference is created once and
+    reused for every request. Readings that arrive while a request is
+    in flight form the next batch, so batching costs no extra latency.
+    """
+
+    def __init__(self, device_id="01", max_batch=100, linger=0.0):
+        """
+        Initialize uploader
+
+        Args:
+            device_id: Device the readings are stored under
+            max_batch: Readings written per request at most
+            linger: Seconds to wait for more readings before writing a
+                batch that is not full, 0 writes right away
+        """
+        self.device_id = device_id
+        self.max_batch = max_batch
+        self.linger = linger
+
+        self.requests = 0
+        self.uploaded = 0
+        self.failed = 0
+
+        self._ref = None
+        self._pending = []
+        self._seq = 0
+        self._latest_ts = 0.0
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the worker after writing what is already pending"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+        # Anything left could not be written
+        with self._cond:
+            pending, self._pending = self._pending, []
+        for _, _, future in pending:
+            if not future.done():
+                future.set_result(False)
+
+    # ------------------------------
+    # QUEUEING
+    # ------------------------------
+    def submit(self, heart_rate, spo2, timestamp=None):
+        """
+        Queue one reading
+
+        Returns:
+            Future: Resolves to True once the batch holding the reading
+            was written, False if the write failed
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        future = Future()
+        with self._cond:
+            if not self._running:
+                future.set_result(False)
+                return future
+
+            self._seq = (self._seq + 1) % 1000
+            # Sortable and unique even for readings in the same millisecond
+            key = f"{int(timestamp * 1000)}{self._seq:03d}"
+            reading = {"hr": heart_rate, "spo2": spo2, "ts": timestamp}
+            self._pending.append((key, reading, future))
+            self._cond.notify()
+        return future
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    # ------------------------------
+    # UPLOAD
+    # ------------------------------
+    def _reference(self):
+        if self._ref is None:
+            from firebase_admin import db
+            self._ref = db.reference("/")
+        return self._ref
+
+    def _take_batch(self):
+        """Wait for readings and return the next batch, None once stopped"""
+        with self._cond:
+            while self._running and not self._pending:
+                self._cond.wait()
+            if not self._pending:
+                return None
+
+            # Give a burst (e.g. a queue drain) the chance to join the batch
+            deadline = time.monotonic() + self.linger
+            while self._running and len(self._pending) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            return batch
+
+    def _build_update(self, batch):
+        base = f"devices/{self.device_id}/readings"
+        update = {f"{base}/{key}": reading for key, reading, _ in batch}
+
+        # Only newer readings move the live values, not a drained backlog
+        newest = max((reading for _, reading, _ in batch), key=lambda r: r["ts"])
+        if newest["ts"] >= self._latest_ts:
+            self._latest_ts = newest["ts"]
+            update["hr"] = newest["hr"]
+            update["O2"] = newest["spo2"]
+        return update
+
+    def _upload(self, batch):
+        try:
+            self._reference().update(self._build_update(batch))
+            success = True
+            self.uploaded += len(batch)
+        except Exception as e:
+            print(f"[Firebase] Upload of {len(batch)} readings failed: {e}")
+            success = False
+            self.failed += len(batch)
+        self.requests += 1
+
+        for _, _, future in batch:
+            future.set_result(success)
+
+    def _worker(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            self._upload(batch)
@@ -0,0 +1,262 @@
+import time
+from array import array
+
+# Graded severities, lowest first
+MONITORING = "monitoring"
+ELEVATED = "elevated"
+CRITICAL = "critical"
+SEVERITIES = (MONITORING, ELEVATED, CRITICAL)
+
+# Message type sent for every severity ("w" gets dual sends and queue priority)
+MESSAGE_TYPES = {
+    MONITORING: "m",
+    ELEVATED: "m",
+    CRITICAL: "w"
+}
+
+# Bands per signal: (critical low, elevated low, elevated high, critical high)
+HR_BANDS = (40, 50, 120, 140)
+SPO2_BANDS = (90, 94, None, None)
+
+
+def _rank(severity):
+    return SEVERITIES.index(severity)
+
+
+def band_level(value, bands, margin=0.0):
+    """
+    Severity of one value against its bands
+
+    margin moves every threshold towards the normal range, which is
+    used to make a reading clear a band by some distance before the
+    severity drops (hysteresis).
+    """
+    crit_low, elev_low, elev_high, crit_high = bands
+    if crit_low is not None and value < crit_low + margin:
+        return CRITICAL
+    if crit_high is not None and value > crit_high - margin:
+        return CRITICAL
+    if elev_low is not None and value < elev_low + margin:
+        return ELEVATED
+    if elev_high is not None and value > elev_high - margin:
+        return ELEVATED
+    return MONITORING
+
+
+class RollingStats:
+    """
+    Mean, variance and least-squares slope over the last n samples
+
+    Running sums are updated as samples enter and leave a preallocated
+    ring, so every update is O(1) regardless of the window. Times are
+    kept relative to the oldest sample and the sums are rebuilt every
+    REBASE_EVERY updates, so rounding errors do not build up.
+    """
+
+    REBASE_EVERY = 1000
+
+    def __init__(self, size=20):
+        self.size = size
+        self._t = array("d", [0.0]) * size
+        self._x = array("d", [0.0]) * size
+        self._next = 0
+        self.n = 0
+        self._origin = None
+        self._updates = 0
+        self._st = self._sx = self._stt = self._stx = self._sxx = 0.0
+
+    def _rebase(self):
+        """Shift times to start at the oldest sample and rebuild the sums"""
+        oldest = self._next if self.n == self.size else 0
+        shift = self._t[oldest]
+        self._origin += shift
+        self._st = self._sx = self._stt = self._stx = self._sxx = 0.0
+        for i in range(self.n):
+            t = self._t[i] = self._t[i] - shift
+            x = self._x[i]
+            self._st += t
+            self._sx += x
+            self._stt += t * t
+            self._stx += t * x
+            self._sxx += x * x
+
+    def push(self, t, x):
+        if self._origin is None:
+            self._origin = t
+        t -= self._origin
+
+        if self.n == self.size:
+            old_t, old_x = self._t[self._next], self._x[self._next]
+            self._st -= old_t
+            self._sx -= old_x
+            self._stt -= old_t * old_t
+            self._stx -= old_t * old_x
+            self._sxx -= old_x * old_x
+        else:
+            self.n += 1
+
+        self._t[self._next] = t
+        self._x[self._next] = x
+        self._next = (self._next + 1) % self.size
+        self._st += t
+        self._sx += x
+        self._stt += t * t
+        self._stx += t * x
+        self._sxx += x * x
+
+        self._updates += 1
+        if self._updates % self.REBASE_EVERY == 0:
+            self._rebase()
+
+    def mean(self):
+        return self._sx / self.n if self.n else 0.0
+
+    def variance(self):
+        if self.n < 2:
+            return 0.0
+        return max(0.0, self._sxx / self.n - self.mean() ** 2)
+
+    def slope(self):
+        """Change per second, 0 until there are enough samples"""
+        if self.n < 3:
+            return 0.0
+        denominator = self.n * self._stt - self._st * self._st
+        if denominator <= 0:
+            return 0.0
+        return (self.n * self._stx - self._st * self._sx) / denominator
+
+
+class VitalsClassifier:
+    """
+    Trend-aware incremental classifier for HR/SpO2 readings
+
+    Every reading is scored against static bands and against the trend
+    of the recent window (slope and spread), giving a graded severity.
+    The reported severity changes with hysteresis: a higher level must
+    be seen confirm samples in a row, and a lower one must hold for
+    clear_after seconds with values clear of the band by a margin, so
+    readings around a threshold do not flip the type on every sample.
+    """
+
+    def __init__(self, window=20, hr_slope=10.0, spo2_slope=-2.0,
+                 hr_std=15.0, hr_margin=5.0, spo2_margin=1.0,
+                 clear_after=30.0, confirm=None):
+        """
+        Initialize classifier
+
+        Args:
+            window: Samples kept for slope and variance
+            hr_slope: HR rise in bpm/min that escalates an already high HR
+            spo2_slope: SpO2 change in %/min that escalates a low SpO2
+            hr_std: HR standard deviation (bpm) treated as unstable
+            hr_margin: bpm a reading must clear an HR band by to drop it
+            spo2_margin: Percent a reading must clear an SpO2 band by
+            clear_after: Seconds at a lower level before de-escalating
+            confirm: Dict of consecutive samples needed to escalate
+        """
+        self.hr = RollingStats(window)
+        self.spo2 = RollingStats(window)
+        self.hr_slope = hr_slope / 60.0
+        self.spo2_slope = spo2_slope / 60.0
+        self.hr_std = hr_std
+        self.hr_margin = hr_margin
+        self.spo2_margin = spo2_margin
+        self.clear_after = clear_after
+        self.confirm = dict({ELEVATED: 2, CRITICAL: 1}, **(confirm or {}))
+
+        self.severity = MONITORING
+        self.since = None
+        self._candidate = MONITORING
+        self._candidate_count = 0
+        self._lower_since = None
+
+    def _band(self, hr, spo2, hr_margin=0.0, spo2_margin=0.0):
+        levels = [MONITORING]
+        if hr >= 0:
+            levels.append(band_level(hr, HR_BANDS, hr_margin))
+        if spo2 >= 0:
+            levels.append(band_level(spo2, SPO2_BANDS, spo2_margin))
+        return max(levels, key=_rank)
+
+    def _level(self, hr, spo2):
+        """Severity of this reading, before the timing rules"""
+        levels = [self._band(hr, spo2)]
+        # Readings have to clear the current band by the margin to leave it
+        sticky = self._band(hr, spo2, self.hr_margin, self.spo2_margin)
+        levels.append(min(sticky, self.severity, key=_rank))
+
+        # Deterioration escalates before the critical thresholds are hit
+        if hr >= 0 and hr > HR_BANDS[2] - 20 and self.hr.slope() >= self.hr_slope:
+            levels.append(ELEVATED)
+        if (spo2 >= 0 and spo2 < SPO2_BANDS[1] + 2
+                and self.spo2.slope() <= self.spo2_slope):
+            levels.append(ELEVATED)
+        if self.hr.n >= 5 and self.hr.variance() ** 0.5 >= self.hr_std:
+            levels.append(ELEVATED)
+
+        return max(levels, key=_rank)
+
+    def update(self, hr, spo2, now=None):
+        """
+        Add a reading, -1 values (no reading) leave the statistics alone
+
+        Returns:
+            str: MONITORING, ELEVATED or CRITICAL
+        """
+        if now is None:
+            now = time.monotonic()
+        if self.since is None:
+            self.since = now
+
+        if hr >= 0:
+            self.hr.push(now, hr)
+        if spo2 >= 0:
+            self.spo2.push(now, spo2)
+        if hr < 0 and spo2 < 0:
+            return self.severity
+
+        level = self._level(hr, spo2)
+
+        if _rank(level) > _rank(self.severity):
+            self._lower_since = None
+            if level == self._candidate:
+                self._candidate_count += 1
+            else:
+                self._candidate, self._candidate_count = level, 1
+            if self._candidate_count >= self.confirm[level]:
+                self._set(level, now)
+
+        elif _rank(level) < _rank(self.severity):
+            self._candidate_count = 0
+            if self._lower_since is None:
+                self._lower_since = now
+            elif now - self._lower_since >= self.clear_after:
+                self._set(level, now)
+
+        else:
+            self._candidate_count = 0
+            self._lower_since = None
+
+        return self.severity
+
+    def _set(self, severity, now):
+        self.severity = severity
+        self.since = now
+        self._candidate_count = 0
+        self._lower_since = None
+
+    def time_in_band(self, now=None):
+        """Seconds since the severity last changed"""
+        if self.since is None:
+            return 0.0
+        return (time.monotonic() if now is None else now) - self.since
+
+    def stats(self):
+        return {
+            "severity": self.severity,
+            "time_in_band": self.time_in_band(),
+            "hr_slope": self.hr.slope() * 60.0,
+            "spo2_slope": self.spo2.slope() * 60.0,
+            "hr_variance": self.hr.variance(),
+            "spo2_variance": self.spo2.variance()
+        }
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import namedtuple
+
+# available/signal as last probed, updated is a time.monotonic() stamp
+LinkState = namedtuple("LinkState", ["available", "signal", "updated", "stale"])
+
+
+class LinkProber:
+    """
+    Background prober for link availability and signal strength
+
+    Refreshes WIFI/BLE/LORA on their own schedule and publishes the
+    results as an immutable snapshot. Readers never take a lock: a
+    refresh builds a new dict and swaps the reference. Writers (the
+    probe thread and startup callbacks) serialize the copy and swap.
+    """
+
+    DEFAULT_INTERVALS = {
+        "BLE": 2.0,
+        "WIFI": 5.0,
+        "LORA": 10.0
+    }
+
+    def __init__(self, selector, intervals=None, ttl=15.0):
+        """
+        Initialize prober
+
+        Args:
+            selector: NetworkSelector whose raw probes are used
+            intervals: Optional dict of seconds between probes per network
+            ttl: Seconds after which a probe result is flagged stale
+        """
+        self.selector = selector
+        self.intervals = dict(self.DEFAULT_INTERVALS)
+        if intervals:
+            self.intervals.update(intervals)
+        self.ttl = ttl
+
+        self._snapshot = {}
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Probe every network once, then keep refreshing in the background"""
+        for net in self.intervals:
+            self.refresh(net)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=3)
+
+    def refresh(self, network):
+        """Probe one network now and publish the result"""
+        available, signal = self.selector.probe(network)
+
+        # Probe outside the lock, only the copy and swap must not interleave
+        with self._write_lock:
+            snapshot = dict(self._snapshot)
+            snapshot[network] = LinkState(available, signal, time.monotonic(), False)
+            self._snapshot = snapshot
+
+    def get(self, network):
+        """
+        Latest state for a network
+
+        Returns:
+            LinkState with the stale flag set if older than ttl,
+            or None if the network was never probed
+        """
+        state = self._snapshot.get(network)
+        if state is None:
+            return None
+        if time.monotonic() - state.updated > self.ttl:
+            return state._replace(stale=True)
+        return state
+
+    def snapshot(self):
+        return {net: self.get(net) for net in self._snapshot}
+
+    def _worker(self):
+        now = time.monotonic()
+        due = {net: now + interval for net, interval in self.intervals.items()}
+
+        while not self._stop.is_set():
+            net = min(due, key=due.get)
+            wait = due[net] - time.monotonic()
+            if wait > 0 and self._stop.wait(wait):
+                break
+
+            try:
+                self.refresh(net)
+            except Exception as e:
+                print(f"[Prober] {net} probe error: {e}")
+
+            due[net] = time.monotonic() + self.intervals[net]
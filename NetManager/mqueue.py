@@ -1,22 +1,338 @@
-from collections import deque
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+# Lower value is sent first
+PRIORITIES = {
+    "w": 0,
+    "m": 1
+}
+MONITORING = PRIORITIES["m"]
+
 
 class MessageQueue:
+    """
+    Durable store-and-forward priority queue backed by SQLite in WAL mode
+
+    Messages survive reboots and power loss. Adds are buffered in memory
+    and committed in batches (every flush_size messages or flush_interval
+    seconds), and WAL with synchronous=NORMAL only syncs on checkpoints,
+    so enqueueing never waits for an fsync per message.
+
+    Messages are ordered by type, then age, through a (priority, id)
+    index, so warnings always leave before monitoring messages and every
+    operation is O(log n). Old monitoring messages are thinned out and
+    finally dropped, and the store is capped at max_messages.
+    """
+
+    PRUNE_INTERVAL = 30
+
+    def __init__(self, path=None, max_messages=50000, flush_size=64,
+                 flush_interval=1.0, monitoring_ttl=3600,
+                 downsample_after=600, downsample_interval=60):
+        """
+        Initialize queue
+
+        Args:
+            path: SQLite file, None keeps the queue in memory only
+            max_messages: Cap on stored messages, monitoring messages
+                are evicted before warnings, oldest first
+            flush_size: Buffered adds that trigger a commit
+            flush_interval: Maximum seconds an add stays uncommitted
+            monitoring_ttl: Seconds after which monitoring messages are
+                dropped, None keeps them
+            downsample_after: Seconds after which monitoring messages are
+                thinned to one per downsample_interval, None disables it
+            downsample_interval: Seconds of history kept per thinned message
+        """
+        self.path = path or ":memory:"
+        self.max_messages = max_messages
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.monitoring_ttl = monitoring_ttl
+        self.downsample_after = downsample_after
+        self.downsample_interval = downsample_interval
+
+        self.dropped = 0
+        self.expired = 0
+        self.downsampled = 0
+        self._last_prune = 0.0
+
+        self._lock = threading.RLock()
+        self._pending = []
+        self._conn = self._open()
+        # Stored messages per priority, kept up to date by every write so
+        # the backlog is known without querying
+        self._counts = self._count_stored()
+        self._pending_counts = dict.fromkeys(PRIORITIES.values(), 0)
+
+        self._closed = threading.Event()
+        self._flusher = None
+        if self.path != ":memory:":
+            self._flusher = threading.Thread(target=self._flush_worker, daemon=True)
+            self._flusher.start()
+
+    # ------------------------------
+    # STORAGE
+    # ------------------------------
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False,
+                               isolation_level=None)
+        if self.path != ":memory:":
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA journal_size_limit=4194304")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " created REAL NOT NULL,"
+            " body TEXT NOT NULL,"
+            " priority INTEGER NOT NULL DEFAULT 1)"
+        )
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(messages)")]
+        if "priority" not in columns:
+            # Queue files written before priorities existed, the default
+            # is only right for monitoring rows
+            with conn:
+                conn.execute("BEGIN")
+                conn.execute(
+                    "ALTER TABLE messages ADD COLUMN priority INTEGER NOT NULL DEFAULT 1")
+                for msg_type, priority in PRIORITIES.items():
+                    if priority != MONITORING:
+                        conn.execute(
+                            "UPDATE messages SET priority = ?"
+                            " WHERE json_extract(body, '$.type') = ?",
+                            (priority, msg_type))
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS messages_order ON messages (priority, id)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS messages_age ON messages (priority, created)")
+        return conn
+
+    def _open(self):
+        """Open the database, moving a corrupt file aside instead of failing"""
+        try:
+            conn = self._connect()
+            if conn.execute("PRAGMA quick_check").fetchone()[0] == "ok":
+                return conn
+            conn.close()
+        except sqlite3.DatabaseError as e:
+            print(f"[Queue] Database error: {e}")
+
+        if self.path == ":memory:":
+            return self._connect()
+
+        print(f"[Queue] {self.path} is corrupt, starting a new queue")
+        os.replace(self.path, self.path + ".corrupt")
+        for suffix in ("-wal", "-shm"):
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
+        return self._connect()
+
+    def _count_stored(self):
+        counts = dict.fromkeys(PRIORITIES.values(), 0)
+        counts.update(self._conn.execute(
+            "SELECT priority, COUNT(*) FROM messages GROUP BY priority"))
+        return counts
+
+    @property
+    def _count(self):
+        return sum(self._counts.values())
+
+    def _flush_worker(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+                self._maybe_prune()
+            except Exception as e:
+                print(f"[Queue] Flush error: {e}")
 
-    def __init__(self):
+    def flush(self):
+        """Commit buffered adds in one transaction"""
+        with self._lock:
+            if not self._pending:
+                return
 
-        self.queue = deque()
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO messages (created, body, priority) VALUES (?, ?, ?)",
+                    self._pending)
+                for priority, count in self._pending_counts.items():
+                    self._counts[priority] += count
+                self._enforce_limit()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._counts = self._count_stored()
+                raise
+            self._pending = []
+            self._pending_counts = dict.fromkeys(PRIORITIES.values(), 0)
 
+    def _enforce_limit(self):
+        excess = self._count - self.max_messages
+        if excess <= 0:
+            return
+
+        self._conn.execute(
+            "DELETE FROM messages WHERE id IN "
+            "(SELECT id FROM messages ORDER BY priority DESC, id LIMIT ?)",
+            (excess,))
+        # Same order as the DELETE: monitoring first, then warnings
+        for priority in sorted(self._counts, reverse=True):
+            evicted = min(excess, self._counts[priority])
+            self._counts[priority] -= evicted
+            excess -= evicted
+            self.dropped += evicted
+
+    def _maybe_prune(self):
+        if time.monotonic() - self._last_prune >= self.PRUNE_INTERVAL:
+            self.prune()
+
+    def prune(self):
+        """Thin out and expire old monitoring messages"""
+        now = time.time()
+        with self._lock:
+            self._last_prune = time.monotonic()
+            if self.downsample_after is not None:
+                cutoff = now - self.downsample_after
+                cur = self._conn.execute(
+                    "DELETE FROM messages WHERE priority = ? AND created < ?"
+                    " AND id NOT IN (SELECT MIN(id) FROM messages"
+                    " WHERE priority = ? AND created < ?"
+                    " GROUP BY CAST(created / ? AS INTEGER))",
+                    (MONITORING, cutoff, MONITORING, cutoff,
+                     self.downsample_interval))
+                self._counts[MONITORING] -= cur.rowcount
+                self.downsampled += cur.rowcount
+
+            if self.monitoring_ttl is not None:
+                cur = self._conn.execute(
+                    "DELETE FROM messages WHERE priority = ? AND created < ?",
+                    (MONITORING, now - self.monitoring_ttl))
+                self._counts[MONITORING] -= cur.rowcount
+                self.expired += cur.rowcount
+
+    def close(self):
+        self._closed.set()
+        if self._flusher:
+            self._flusher.join(timeout=2)
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+    # ------------------------------
+    # QUEUE API
+    # ------------------------------
     def add(self, msg):
 
-        self.queue.append(msg)
+        priority = PRIORITIES.get(msg.get("type"), MONITORING)
+        with self._lock:
+            self._pending.append((time.time(), json.dumps(msg), priority))
+            self._pending_counts[priority] += 1
+            if len(self._pending) >= self.flush_size:
+                self.flush()
+
+    def peek_batch(self, n, exclude=()):
+        """
+        Read up to n messages in send order without removing them
+
+        Args:
+            n: Messages to read at most
+            exclude: Ids to skip, e.g. messages still being sent
+
+        Returns:
+            list: (id, msg) pairs, pass the ids to remove() once sent
+        """
+        with self._lock:
+            self.flush()
+            self._maybe_prune()
+            rows = self._conn.execute(
+                "SELECT id, body FROM messages ORDER BY priority, id LIMIT ?",
+                (n + len(exclude),)).fetchall()
+        rows = [row for row in rows if row[0] not in exclude][:n]
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+    def remove(self, ids):
+        """Delete messages by id after they were delivered"""
+        if not ids:
+            return
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            # One indexed lookup per id, needed to keep the counters right
+            ids = list(ids)
+            removed = []
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                removed += self._conn.execute(
+                    "SELECT priority, COUNT(*) FROM messages WHERE id IN (%s)"
+                    " GROUP BY priority" % ",".join("?" * len(chunk)), chunk).fetchall()
+            self._conn.executemany(
+                "DELETE FROM messages WHERE id = ?", [(i,) for i in ids])
+            self._conn.execute("COMMIT")
+            for priority, count in removed:
+                self._counts[priority] -= count
+
+    def get_batch(self, n):
+
+        with self._lock:
+            batch = self.peek_batch(n)
+            self.remove([msg_id for msg_id, _ in batch])
+        return [msg for _, msg in batch]
 
     def get(self):
 
-        if len(self.queue) > 0:
-            return self.queue.popleft()
+        batch = self.get_batch(1)
+        if len(batch) > 0:
+            return batch[0]
 
         return None
 
     def empty(self):
 
-        return len(self.queue) == 0
\ No newline at end of file
+        return len(self) == 0
+
+    def __len__(self):
+
+        with self._lock:
+            return self._count + len(self._pending)
+
+    def backlog(self):
+        """
+        Messages waiting per type, from counters, no database access
+
+        Returns:
+            dict: "warnings" and "monitoring", buffered adds included
+        """
+        with self._lock:
+            return {
+                "warnings": (self._counts[PRIORITIES["w"]]
+                             + self._pending_counts[PRIORITIES["w"]]),
+                "monitoring": self._counts[MONITORING] + self._pending_counts[MONITORING]
+            }
+
+    def stats(self):
+        """Occupancy metrics for monitoring backlog growth"""
+        with self._lock:
+            # Not yet written, read before flush() writes them
+            pending = len(self._pending)
+            self.flush()
+            oldest = self._conn.execute(
+                "SELECT MIN(created) FROM messages").fetchone()[0]
+            return {
+                "total": self._count,
+                "pending": pending,
+                "warnings": self._counts[PRIORITIES["w"]],
+                "monitoring": self._counts[MONITORING],
+                "oldest_age": time.time() - oldest if oldest else 0.0,
+                "capacity": self.max_messages,
+                "dropped": self.dropped,
+                "expired": self.expired,
+                "downsampled": self.downsampled
+            }
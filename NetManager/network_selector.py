@@ -1,9 +1,16 @@
+import re
 import socket
 import subprocess
 import time
 import json
 import random
 
+from Comms.lora.frame import HEALTH_FRAME_SIZE
+from NetManager.classifier import (VitalsClassifier, MESSAGE_TYPES, SEVERITIES,
+                                   MONITORING, ELEVATED, CRITICAL, HR_BANDS,
+                                   SPO2_BANDS, band_level)
+
+
 class NetworkSelector:
 
     def __init__(self, ble_agent, wifi_enabled=True, lora_sender=None):
@@ -16,6 +23,15 @@ class NetworkSelector:
         self.counter = 0
         self.flag = False
 
+        # Optional LinkProber, keeps probing off the per-message path
+        self.prober = None
+
+        # Optional callable, WIFI stays unavailable until it returns True
+        self.wifi_ready = None
+
+        # Trend-aware severity of the live readings
+        self.classifier = VitalsClassifier()
+
         # Reliability tracking
         self.stats_w = {
             "BLE": {"success": 5, "fail": 5},
@@ -29,6 +45,13 @@ class NetworkSelector:
             "LORA": {"success": 5, "fail": 5}
         }
 
+        # Observed delivery latency in seconds (EWMA), None until measured
+        self.delivery_latency = {
+            "BLE": None,
+            "WIFI": None,
+            "LORA": None
+        }
+
         # Energy model
         self.consumptions = {
             "BLE": {"base": 0.2, "per_byte": 0.001, "per_sec": 0.05},
@@ -47,16 +70,38 @@ class NetworkSelector:
     # MESSAGE CLASSIFICATION
     # ------------------------------
 
+    def classify_severity(self, hr, spo2):
+        """
+        Graded severity of a reading: monitoring, elevated or critical
+
+        Live readings go through the trend-aware classifier. Demo values
+        are scripted, so they are judged on their own, without history.
+        """
+        if self.demo:
+            # -1 means no reading, not a dangerously low value
+            levels = [MONITORING]
+            if hr >= 0:
+                levels.append(band_level(hr, HR_BANDS))
+            if spo2 >= 0:
+                levels.append(band_level(spo2, SPO2_BANDS))
+            return max(levels, key=SEVERITIES.index)
+
+        return self.classifier.update(hr, spo2)
+
     def classify_message(self, hr, spo2):
 
-        if hr < 40 or hr > 140 or spo2 < 90:
-            return "w"
-        return "m"
+        return MESSAGE_TYPES[self.classify_severity(hr, spo2)]
 
     # ------------------------------
     # RELIABILITY
     # ------------------------------
-    def update_stats(self, network, success, msg):
+    def update_stats(self, network, success, msg, latency=None):
+        if success and latency is not None:
+            previous = self.delivery_latency[network]
+            self.delivery_latency[network] = (
+                latency if previous is None else 0.8 * previous + 0.2 * latency
+            )
+
         if success:
             if(msg["type"] == 'w'):
                 self.stats_w[network]["success"] += 1
@@ -113,7 +158,10 @@ class NetworkSelector:
     def normalize_energy(self, energy):
         return 1 / (1 + energy) 
 
-    def calc_payload(self, msg):
+    def calc_payload(self, msg, network=None):
+        if network == "LORA":
+            # LoRa carries readings as fixed-size binary frames
+            return HEALTH_FRAME_SIZE
         return len(json.dumps(msg).encode('utf-8'))
     
     # ------------------------------
@@ -136,21 +184,12 @@ class NetworkSelector:
 
     def ble_strength(self):
         try:
-            from Comms.bluetooth.bletools import BleTools
-            import dbus
-            bus = BleTools.get_bus()
-            remote_om = dbus.Interface(bus.get_object("org.bluez", "/"),
-                                    "org.freedesktop.DBus.ObjectManager")
-            objects = remote_om.GetManagedObjects()
-            
-            for path, props in objects.items():
-                if "org.bluez.Device1" in props:
-                    device = props["org.bluez.Device1"]
-                    if device.get("Connected") and "RSSI" in device:
-                        rssi = int(device["RSSI"])
-                        return max(0.0, min(1.0, (rssi + 90) / 40))
-            
-            return 0.5  # no client connected, honest fallback
+            # Kept up to date by BLEAgent from BlueZ signals
+            rssi = self.ble_agent.client_rssi()
+            if rssi is not None:
+                return max(0.0, min(1.0, (rssi + 90) / 40))
+
+            return 0.5  # no RSSI reported, honest fallback
         except:
             return 0.5
         
@@ -165,6 +204,16 @@ class NetworkSelector:
                 "WIFI": self.demo["wifi_signal"],
                 "LORA": self.demo["lora_signal"]
             }[network]
+
+        state = self.prober.get(network) if self.prober else None
+        if state is not None:
+            if state.stale or state.signal is None:
+                return 0.5
+            return state.signal
+
+        return self.measure_signal_strength(network)
+
+    def measure_signal_strength(self, network):
         if network == "WIFI":
             return self.wifi_strength()
         elif network == "BLE":
@@ -183,6 +232,9 @@ class NetworkSelector:
         if not self.wifi_enabled:
             return False
 
+        if self.wifi_ready and not self.wifi_ready():
+            return False
+
         try:
             socket.create_connection(("8.8.8.8", 53), timeout=2)
             return True
@@ -194,7 +246,8 @@ class NetworkSelector:
             return self.demo["ble_available"]
         
         try:
-            return self.ble_agent is not None and self.ble_agent.is_running()
+            # Only worth picking when a central is connected and subscribed
+            return self.ble_agent is not None and self.ble_agent.has_listener()
         except:
             return False
 
@@ -204,11 +257,35 @@ class NetworkSelector:
 
         return self.lora_sender is not None
 
+    def check_available(self, network):
+        return {
+            "BLE": self.ble_available,
+            "WIFI": self.wifi_available,
+            "LORA": self.lora_available
+        }[network]()
+
+    def is_available(self, network):
+        if self.demo:
+            return self.check_available(network)
+
+        # A stale entry keeps its last value, probing stays off this path
+        state = self.prober.get(network) if self.prober else None
+        if state is not None:
+            return state.available
+
+        return self.check_available(network)
+
+    def probe(self, network):
+        """Run the raw availability and signal probes for one network"""
+        available = self.check_available(network)
+        signal = self.measure_signal_strength(network) if available else None
+        return available, signal
+
     # ------------------------------
     # SCORING
     # ------------------------------
     def score_network(self, network, available, msg):
-        payload = self.calc_payload(msg)
+        payload = self.calc_payload(msg, network)
         if not available:
             return -1
 
@@ -229,8 +306,13 @@ class NetworkSelector:
         latency = self.networks[network]["latency"]
         range_ = self.networks[network]["range"]
 
-        # Weights depending on message type
-        if msg["type"] == "m":
+        # Weights depending on severity, messages queued before severities
+        # existed only carry their type
+        severity = msg.get("severity")
+        if severity is None:
+            severity = CRITICAL if msg["type"] == "w" else MONITORING
+
+        if severity == MONITORING:
             if battery < 20:
 
                 w = {
@@ -248,7 +330,16 @@ class NetworkSelector:
                     "energy":      0.3,
                     "latency":     0.25
             }
-        else:  # WARNING
+        elif severity == ELEVATED:
+            # Worsening, but not yet a warning: favour reliability and speed
+            w = {
+                "reliability": 0.3,
+                "signal":      0.15,
+                "range":       0.2,
+                "energy":      0.15,
+                "latency":     0.2
+            }
+        else:  # CRITICAL
             w = {
                 "reliability": 0.4,
                 "signal":      0.15,
@@ -279,9 +370,9 @@ class NetworkSelector:
                 self.flag = True
 #"BLE": (False if self.flag else self.ble_available()),
         availability = {
-            "BLE":  self.ble_available(),
-            "WIFI": self.wifi_available(),
-            "LORA": self.lora_available()
+            "BLE":  self.is_available("BLE"),
+            "WIFI": self.is_available("WIFI"),
+            "LORA": self.is_available("LORA")
         }
 
         scores = {}
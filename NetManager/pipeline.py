@@ -0,0 +1,348 @@
+import asyncio
+import json
+import time
+from concurrent.futures import Future
+
+from NetManager.classifier import MESSAGE_TYPES, ELEVATED
+
+NETWORKS = ("BLE", "WIFI", "LORA")
+
+
+class Pipeline:
+    """
+    Asyncio runtime for the health monitor
+
+    Acquisition, selection and transmission run as separate stages
+    connected by bounded queues. Every network has its own transmission
+    stage, so a stalled radio never holds up sampling or the other
+    radios. Warnings routed over two networks go out on both at once
+    and count as delivered on the first success. Queued messages are
+    drained separately by a Retransmitter.
+    """
+
+    def __init__(self, sensor, selector, transmitter, queue,
+                 demo_path=None, sample_interval=3, queue_size=16,
+                 ble_agent=None, vitals_filter=None, started=None,
+                 ready=None):
+        """
+        Initialize pipeline
+
+        Args:
+            sensor: Sensor providing get_readings(), may be set later
+                while it is still initializing
+            selector: NetworkSelector used to classify and route messages
+            transmitter: Transmitter used to send messages
+            queue: MessageQueue holding messages that failed to send
+            demo_path: Optional demo JSON file replacing the sensor
+            sample_interval: Seconds between sensor samples
+            queue_size: Capacity of every inter-stage queue
+            ble_agent: Optional BLEAgent that buffers readings sent over
+                other networks for BLE history catch-up
+            vitals_filter: Optional VitalsFilter cleaning sensor readings
+                before they are classified
+            started: time.monotonic() at process start, used to report
+                the time to the first delivered reading
+            ready: Optional callable(timeout) returning True once
+                sampling can start, e.g. a transport is up
+        """
+        self.sensor = sensor
+        self.selector = selector
+        self.transmitter = transmitter
+        self.queue = queue
+        self.demo_path = demo_path
+        self.sample_interval = sample_interval
+        self.queue_size = queue_size
+        self.ble_agent = ble_agent
+        self.vitals_filter = vitals_filter
+        self.started = started
+        self.ready = ready
+        self.first_delivery = None
+
+        self.sensor_state = None
+        self.readings = None
+        self.tx_queues = {}
+        self._loop = None
+        self._stopped = None
+        self._deliveries = set()
+
+    # ------------------------------
+    # LIFECYCLE
+    # ------------------------------
+    async def run(self):
+        """Run all stages until stop() is called"""
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self.readings = asyncio.Queue(maxsize=self.queue_size)
+        self.tx_queues = {
+            net: asyncio.Queue(maxsize=self.queue_size) for net in NETWORKS
+        }
+
+        stages = {"acquire": self._acquire, "select": self._select}
+        for net in self.tx_queues:
+            stages[f"transmit {net}"] = lambda net=net: self._transmit(net)
+        tasks = {asyncio.create_task(start()): name for name, start in stages.items()}
+
+        # A stage only ends if it died, restart it instead of going quiet
+        stopped = asyncio.create_task(self._stopped.wait())
+        while not self._stopped.is_set():
+            done, _ = await asyncio.wait([stopped, *tasks],
+                                         return_when=asyncio.FIRST_COMPLETED)
+            dead = [task for task in done if task is not stopped]
+            for task in dead:
+                error = task.exception() if not task.cancelled() else "cancelled"
+                print(f"[Pipeline] {tasks[task]} stage died ({error!r}), restarting")
+            if dead:
+                # Do not spin if a stage keeps dying right away
+                await self._sleep(1.0)
+            for task in dead:
+                name = tasks.pop(task)
+                tasks[asyncio.create_task(stages[name]())] = name
+
+        for task in list(tasks) + list(self._deliveries):
+            task.cancel()
+        await asyncio.gather(*tasks, *self._deliveries, return_exceptions=True)
+
+    def stop(self):
+        """Request shutdown, safe to call from signal handlers and threads"""
+        if self._loop is not None and self._stopped is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    async def _sleep(self, seconds):
+        """Sleep that wakes up early on shutdown"""
+        try:
+            await asyncio.wait_for(self._stopped.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    # ------------------------------
+    # ACQUISITION
+    # ------------------------------
+    def _read(self):
+        if self.demo_path:
+            with open(self.demo_path) as f:
+                demo = json.load(f)
+            readings = {
+                "heart_rate": demo["heart_rate"],
+                "spo2": demo["spo2"]
+            }
+            return readings, demo
+
+        if self.sensor is None:
+            return None, None
+        return self.sensor.get_readings(), None
+
+    def _check_sensor(self):
+        """Report sensor state transitions (ok / degraded / failed)"""
+        state = getattr(self.sensor, "state", None)
+        if state != self.sensor_state:
+            if self.sensor_state is not None or state != "ok":
+                print(f"[Sensor] State: {self.sensor_state or 'starting'} -> {state}")
+            self.sensor_state = state
+
+    async def _wait_ready(self):
+        """Hold sampling back until there is something to send it over"""
+        while not self._stopped.is_set():
+            try:
+                if await asyncio.to_thread(self.ready, 0.5):
+                    return
+            except Exception as e:
+                print(f"Readiness check error: {e}")
+                return
+
+    async def _acquire(self):
+        if self.ready:
+            await self._wait_ready()
+
+        while not self._stopped.is_set():
+            try:
+                readings, demo = await asyncio.to_thread(self._read)
+            except Exception as e:
+                print(f"Sensor read error: {e}")
+                readings, demo = None, None
+
+            if not self.demo_path:
+                self._check_sensor()
+
+            if readings is not None:
+                if self.readings.full():
+                    # Selection is behind, the newest sample wins
+                    self.readings.get_nowait()
+                self.readings.put_nowait((readings, demo))
+
+            await self._sleep(self.sample_interval)
+
+    # ------------------------------
+    # CLASSIFICATION / SELECTION
+    # ------------------------------
+    async def _select(self):
+        while True:
+            readings, demo = await self.readings.get()
+            try:
+                await self._select_one(readings, demo)
+            except Exception as e:
+                # Lose this reading, not the stage
+                print(f"Selection error: {e!r}")
+
+    async def _select_one(self, readings, demo):
+        hr = readings['heart_rate']
+        o2 = readings['spo2']
+        if self.vitals_filter and not demo:
+            # Demo values are scripted, only real readings are filtered
+            hr, o2 = self.vitals_filter.update(hr, o2)
+        severity = self.selector.classify_severity(hr, o2)
+        msg = {"hr": hr, "spo2": o2, "type": MESSAGE_TYPES[severity],
+               "severity": severity, "ts": time.time()}
+
+        networks = await self._route(msg)
+        if self.ble_agent and "BLE" not in networks:
+            # BLE sends record it themselves
+            self.ble_agent.record_reading(hr, o2)
+        self._spawn(self._deliver(msg, networks, demo))
+
+    async def _route(self, msg):
+        best, second = await asyncio.to_thread(self.selector.choose_network, msg)
+
+        networks = []
+        if best:
+            networks.append(best)
+            if msg["type"] == "w" and second:
+                networks.append(second)
+        return networks
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._deliveries.add(task)
+        task.add_done_callback(self._delivery_done)
+
+    def _delivery_done(self, task):
+        self._deliveries.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Delivery error: {task.exception()!r}")
+
+    async def _deliver(self, msg, networks, demo):
+        """Hand a message to the transmission stages and wait for the outcome"""
+        if msg["type"] == "w" and len(networks) > 1:
+            await self._deliver_redundant(msg, networks, demo)
+            return
+
+        futures = []
+        for net in networks:
+            fut = self._loop.create_future()
+            try:
+                self.tx_queues[net].put_nowait((msg, demo, fut))
+            except asyncio.QueueFull:
+                # That radio is backed up, do not wait behind it
+                fut.set_result(False)
+            futures.append(fut)
+
+        results = await asyncio.gather(*futures)
+        network = networks[results.index(True)] if any(results) else None
+        self._finish(msg, networks, network, demo)
+
+    async def _deliver_redundant(self, msg, networks, demo):
+        """Send a warning over all networks at once, done on the first success"""
+        def on_result(network, success, latency):
+            self.selector.update_stats(network, success, msg, latency)
+
+        try:
+            # Only starting the sends runs in a thread, the wait is on the loop
+            delivery = await asyncio.to_thread(
+                self.transmitter.send_redundant, networks, msg, on_result)
+            network = await asyncio.wrap_future(delivery)
+        except Exception as e:
+            print(f"Redundant transmission error: {e}")
+            network = None
+        self._finish(msg, networks, network, demo)
+
+    def _finish(self, msg, networks, network, demo):
+        """Queue or report a message, network is the one that delivered it"""
+        success = network is not None
+
+        if demo and demo["force_fail"] == True:
+            success = False
+
+        if success and self.first_delivery is None and self.started is not None:
+            self.first_delivery = time.monotonic() - self.started
+            print(f"[Startup] First reading delivered over {network} "
+                  f"{self.first_delivery:.2f} s after start")
+
+        if not success:
+            self.queue.add(msg)
+
+        self._report(msg, networks, success, demo)
+
+    # ------------------------------
+    # TRANSMISSION
+    # ------------------------------
+    def _submit(self, network, msg, demo):
+        delivery = self.transmitter.submit(network, msg)
+        if (network == "BLE" and msg["type"] == "m" and demo
+                and demo["switch"] == True and self.selector.flag == True):
+            delivery = Future()
+            delivery.set_result(False)
+        return delivery
+
+    async def _transmit(self, network):
+        queue = self.tx_queues[network]
+        while True:
+            msg, demo, fut = await queue.get()
+            started = self._loop.time()
+            try:
+                delivery = await asyncio.to_thread(self._submit, network, msg, demo)
+            except Exception as e:
+                print(f"{network} transmission stage error: {e}")
+                delivery = None
+            # Wait for the outcome off this stage so several frames can be in flight
+            self._spawn(self._complete(network, msg, delivery, started, fut))
+
+    async def _complete(self, network, msg, delivery, started, fut):
+        try:
+            success = bool(await asyncio.wrap_future(delivery)) if delivery else False
+        except Exception as e:
+            print(f"{network} delivery error: {e}")
+            success = False
+
+        latency = self._loop.time() - started
+        self.selector.update_stats(network, success, msg, latency)
+        if not fut.done():
+            fut.set_result(success)
+
+    # ------------------------------
+    # REPORTING
+    # ------------------------------
+    def _report(self, msg, networks, success, demo):
+        best = networks[0] if networks else None
+        second = networks[1] if len(networks) > 1 else None
+
+        battery_msg = ""
+
+        if demo and demo["battery"] < 20:
+            battery_msg = f"\nLow battery percentage: {demo['battery']}%"
+
+        queue_msg = ""
+
+        if not success:
+            stats = self.queue.backlog()
+            queue_msg = (
+                "\nTransmission failed, storing message in queue."
+                f"\nQueue:      {stats['warnings']} warnings, "
+                f"{stats['monitoring']} monitoring"
+            )
+
+        severity_msg = ""
+
+        if msg.get("severity") == ELEVATED:
+            severity_msg = " (elevated)"
+
+        print(
+                f"_____________________________________________"
+                f"\nHR:         {msg['hr']} "
+                f"\nSpO2:       {msg['spo2']} "
+                f"\nNetwork:    {best if best else 'None available'} "
+                f"{'and ' + second if msg['type'] == 'w' and second is not None else ''} "
+                f"\nType:       {'Monitoring' if msg['type'] == 'm' else 'Warning'}{severity_msg}"
+                f"\nSuccess:    {success}"
+                f"{queue_msg}"
+                f"{battery_msg}"
+                f"\n_____________________________________________"
+        )
@@ -0,0 +1,213 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+# BLE is left out: a reading pushed through the characteristics shows up
+# as live, and clients catch up through the history characteristic
+NETWORKS = ("WIFI", "LORA")
+
+
+class TokenBucket:
+    """Simple token bucket, rate in messages per second"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self):
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Retransmitter:
+    """
+    Background worker that drains the MessageQueue when links recover
+
+    Pulls batches from the queue, sends them over the best available
+    WIFI or LORA network and removes a message only once it was sent. A
+    whole batch is submitted before waiting for the results, so
+    transports that batch (the Firebase uploader, the LoRa ACK window)
+    see it at once. A send that is still pending after result_timeout
+    (e.g. a LoRa frame inside its ARQ retry window) stays in flight: it
+    is neither counted as failed nor sent again until it resolves. Every
+    network has its own rate limit and exponential backoff after
+    failures. Runs in its own thread so a large backlog never delays
+    live readings.
+    """
+
+    DEFAULT_RATES = {
+        "WIFI": 10.0,
+        "LORA": 0.5
+    }
+
+    def __init__(self, queue, selector, transmitter, batch_size=10,
+                 rates=None, base_backoff=1.0, max_backoff=60.0,
+                 idle_interval=2.0, result_timeout=30.0):
+        """
+        Initialize retransmitter
+
+        Args:
+            queue: MessageQueue holding unsent messages
+            selector: NetworkSelector used for availability and scoring
+            transmitter: Transmitter used to resend messages
+            batch_size: Messages read from the queue per pass
+            rates: Optional dict of messages per second per network
+            base_backoff: Seconds to wait after a network's first failure
+            max_backoff: Upper bound for the backoff delay
+            idle_interval: Seconds to wait when there is nothing to do
+            result_timeout: Seconds to wait for a batch before the next
+                pass, sends still pending stay in flight
+        """
+        self.queue = queue
+        self.selector = selector
+        self.transmitter = transmitter
+        self.batch_size = batch_size
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.idle_interval = idle_interval
+        self.result_timeout = result_timeout
+
+        rates = dict(self.DEFAULT_RATES, **(rates or {}))
+        self._buckets = {net: TokenBucket(rates[net]) for net in NETWORKS}
+        self._failures = {net: 0 for net in NETWORKS}
+        self._retry_at = {net: 0.0 for net in NETWORKS}
+
+        # msg_id -> (msg, network, future) for sends not resolved yet
+        self._inflight = {}
+        self.sent = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _worker(self):
+        while not self._stop.is_set():
+            try:
+                delay = self.drain_once()
+            except Exception as e:
+                print(f"[Retransmit] Drain error: {e}")
+                delay = self.idle_interval
+            if delay > 0:
+                self._stop.wait(delay)
+
+    # ------------------------------
+    # BACKOFF
+    # ------------------------------
+    def _record(self, network, success):
+        if success:
+            self._failures[network] = 0
+            self._retry_at[network] = 0.0
+        else:
+            self._failures[network] += 1
+            backoff = self.base_backoff * 2 ** (self._failures[network] - 1)
+            self._retry_at[network] = time.monotonic() + min(self.max_backoff, backoff)
+
+    def usable_networks(self):
+        now = time.monotonic()
+        return [
+            net for net in NETWORKS
+            if now >= self._retry_at[net] and self.selector.is_available(net)
+        ]
+
+    # ------------------------------
+    # DRAIN
+    # ------------------------------
+    def drain_once(self):
+        """
+        Resend one batch
+
+        Returns:
+            float: Seconds to wait before the next pass, 0 to continue
+        """
+        self._collect()
+
+        if self.selector.demo and self.selector.demo["force_fail"] == True:
+            return self.idle_interval
+
+        if len(self.queue) <= len(self._inflight):
+            return self._wait_inflight()
+
+        networks = self.usable_networks()
+        if not networks:
+            now = time.monotonic()
+            pending = [t - now for t in self._retry_at.values() if t > now]
+            return min(pending + [self.idle_interval])
+
+        submitted = []
+        delay = 0.0
+        for msg_id, msg in self.queue.peek_batch(self.batch_size,
+                                                 exclude=self._inflight):
+            ranked = sorted(
+                networks,
+                key=lambda net: self.selector.score_network(net, True, msg),
+                reverse=True)
+            network = next((net for net in ranked if self._buckets[net].take()), None)
+            if network is None:
+                # Every usable link is at its rate limit
+                delay = min(self._buckets[net].wait_time() for net in networks)
+                break
+
+            future = self.transmitter.submit(network, msg)
+            self._inflight[msg_id] = (msg, network, future)
+            submitted.append(future)
+
+        if not submitted:
+            return delay or self._wait_inflight()
+
+        wait(submitted, timeout=self.result_timeout)
+        self._collect()
+        return delay
+
+    def _wait_inflight(self):
+        """Nothing new to send, sleep until a pending send resolves"""
+        if not self._inflight:
+            return self.idle_interval
+        wait([future for _, _, future in self._inflight.values()],
+             timeout=self.idle_interval, return_when=FIRST_COMPLETED)
+        self._collect()
+        return 0.0
+
+    def _collect(self):
+        """Account for sends that resolved and drop delivered messages"""
+        delivered = []
+        for msg_id, (msg, network, future) in list(self._inflight.items()):
+            if not future.done():
+                continue
+            del self._inflight[msg_id]
+            try:
+                success = bool(future.result())
+            except Exception as e:
+                print(f"[Retransmit] {network} send error: {str(e) or type(e).__name__}")
+                success = False
+            self.selector.update_stats(network, success, msg)
+            self._record(network, success)
+
+            if success:
+                delivered.append(msg_id)
+
+        self.queue.remove(delivered)
+        self.sent += len(delivered)
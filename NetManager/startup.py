@@ -0,0 +1,133 @@
+import threading
+import time
+
+
+class Startup:
+    """
+    Concurrent initialization of the node subsystems
+
+    Every subsystem (sensor, BLE, LoRa, Firebase) is brought up by its
+    own init function in its own thread. An init function blocks until
+    its subsystem is actually usable and returns it, so readiness is an
+    explicit signal instead of a guessed sleep. Callers wait for one
+    subsystem, or for the first of several, and can hook callbacks that
+    run as soon as a subsystem is ready, before any wait() for it returns.
+    """
+
+    def __init__(self, started=None):
+        """
+        Initialize orchestrator
+
+        Args:
+            started: time.monotonic() at process start, ready times are
+                reported relative to it
+        """
+        self.started = time.monotonic() if started is None else started
+
+        self.results = {}
+        self.errors = {}
+        self.ready_after = {}
+        self._tasks = {}
+        self._callbacks = {}
+        self._cond = threading.Condition()
+
+    def add(self, name, init):
+        """
+        Register a subsystem
+
+        Args:
+            name: Name used by wait() and on_ready()
+            init: Callable returning the ready subsystem. Raising, or
+                returning None or False, marks it as failed
+        """
+        self._tasks[name] = init
+        self._callbacks.setdefault(name, [])
+
+    def start(self):
+        """Run every init function in its own thread"""
+        for name, init in self._tasks.items():
+            threading.Thread(target=self._run, args=(name, init),
+                             name=f"init-{name}", daemon=True).start()
+        return self
+
+    def _run(self, name, init):
+        try:
+            result = init()
+            if result is None or result is False:
+                raise RuntimeError("not available")
+        except Exception as e:
+            with self._cond:
+                self.errors[name] = e
+                self._cond.notify_all()
+            print(f"[Startup] {name} failed after {self._elapsed():.2f} s: {e}")
+            return
+
+        # Wire the subsystem in before anyone waiting on it proceeds
+        while True:
+            with self._cond:
+                callbacks, self._callbacks[name] = self._callbacks[name], []
+                if not callbacks:
+                    self.results[name] = result
+                    self.ready_after[name] = self._elapsed()
+                    self._cond.notify_all()
+                    break
+            for callback in callbacks:
+                self._call(name, callback, result)
+        print(f"[Startup] {name} ready after {self.ready_after[name]:.2f} s")
+
+    def _elapsed(self):
+        return time.monotonic() - self.started
+
+    def _call(self, name, callback, result):
+        try:
+            callback(result)
+        except Exception as e:
+            print(f"[Startup] {name} ready callback error: {e}")
+
+    # ------------------------------
+    # READINESS
+    # ------------------------------
+    def on_ready(self, name, callback):
+        """Run callback(subsystem) once name is ready, right away if it is"""
+        with self._cond:
+            if name not in self.results:
+                self._callbacks.setdefault(name, []).append(callback)
+                return
+            result = self.results[name]
+        self._call(name, callback, result)
+
+    def is_ready(self, name):
+        return name in self.results
+
+    def finished(self, names):
+        """True once every named subsystem is either ready or failed"""
+        with self._cond:
+            return all(n in self.results or n in self.errors for n in names)
+
+    def wait(self, name, timeout=None):
+        """
+        Wait until one subsystem finished initializing
+
+        Returns:
+            The subsystem, None if it failed or the timeout expired
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: name in self.results or name in self.errors, timeout)
+            return self.results.get(name)
+
+    def wait_any(self, names, timeout=None):
+        """
+        Wait until the first of several subsystems is ready
+
+        Returns:
+            str: Name of a ready subsystem, None if all of them failed
+            or the timeout expired
+        """
+        def done():
+            return (any(n in self.results for n in names)
+                    or all(n in self.errors for n in names))
+
+        with self._cond:
+            self._cond.wait_for(done, timeout)
+            return next((n for n in names if n in self.results), None)
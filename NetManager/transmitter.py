@@ -1,38 +1,129 @@
-import firebase_admin
+import threading
+import time
+from concurrent.futures import Future
+
+
+def _resolved(success):
+    future = Future()
+    future.set_result(success)
+    return future
+
 
 class Transmitter:
 
-    def __init__(self, ble_agent, lora_sender):
+    def __init__(self, ble_agent, lora_sender, wifi_uploader=None):
 
         self.ble = ble_agent
         self.lora = lora_sender
+        # FirebaseUploader, without one WIFI sends are written inline
+        self.wifi = wifi_uploader
 
-    def send(self, network, msg):
+    def submit(self, network, msg):
+        """
+        Start sending msg over network
 
+        Returns:
+            Future: Resolves to True on success. BLE sends finish before
+            this returns, WIFI resolves once the uploader wrote the
+            batch holding the reading, LORA resolves on delivery when
+            the sender runs in reliable mode.
+        """
         try:
 
             if network == "BLE":
-                
+
                 self.ble.update_data(msg["hr"], msg["spo2"])
 
             elif network == "WIFI":
 
+                if self.wifi:
+                    return self.wifi.submit(msg["hr"], msg["spo2"],
+                                            timestamp=msg.get("ts"))
+
                 from firebase_admin import db
                 ref = db.reference("/")
                 ref.update({"hr": msg["hr"], "O2": msg["spo2"]})
 
             elif network == "LORA":
 
-                self.lora.send_health_data(
+                return self.lora.send_health_data(
                     heart_rate= msg["hr"],
-                    spo2=msg["spo2"]
-                    
+                    spo2=msg["spo2"],
+                    timestamp=msg.get("ts")
                 )
-            
-            return True
+
+            return _resolved(True)
 
         except Exception as e:
 
             print("Transmission error:", e)
 
-            return False
\ No newline at end of file
+            return _resolved(False)
+
+    def send(self, network, msg):
+
+        return self.submit(network, msg).result()
+
+    # ------------------------------
+    # REDUNDANT DELIVERY
+    # ------------------------------
+    def send_redundant(self, networks, msg, on_result=None):
+        """
+        Send msg over several networks at once
+
+        Every network is started with submit(), which does not wait for
+        delivery, so a slow link (e.g. a Firebase timeout) does not hold
+        up the others. Nothing blocks: the returned Future resolves as
+        soon as one network delivered, or once every network gave up.
+        There is no deadline of its own, a link still retrying (LoRa
+        ARQ) is never counted as failed, so a late success is not
+        queued and sent again.
+
+        Args:
+            networks: Networks to send over
+            msg: Message to send
+            on_result: Optional callback(network, success, latency) run
+                once each network finished, in the thread resolving it
+
+        Returns:
+            Future: Resolves to the first network that delivered, None
+            if all of them failed
+        """
+        started = time.monotonic()
+        result = Future()
+        lock = threading.Lock()
+        remaining = [len(networks)]
+
+        def done(network, future):
+            success = self._succeeded(network, future)
+            if on_result:
+                self._report(network, success, started, on_result)
+            with lock:
+                remaining[0] -= 1
+                if result.done():
+                    return
+                if success:
+                    result.set_result(network)
+                elif remaining[0] == 0:
+                    result.set_result(None)
+
+        if not networks:
+            result.set_result(None)
+        for net in networks:
+            self.submit(net, msg).add_done_callback(
+                lambda f, net=net: done(net, f))
+        return result
+
+    def _succeeded(self, network, future):
+        try:
+            return bool(future.result())
+        except Exception as e:
+            print(f"{network} delivery error: {str(e) or type(e).__name__}")
+            return False
+
+    def _report(self, network, success, started, on_result):
+        latency = time.monotonic() - started
+        try:
+            on_result(network, success, latency)
+        except Exception as e:
+            print(f"{network} result callback error: {e}")
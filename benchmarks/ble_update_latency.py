@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Latency of BLEAgent.update_data under load
+
+Runs a real GLib mainloop with stand-in characteristics whose setters
+cost as much as a PropertiesChanged round trip, plus a mainloop task
+that keeps the loop busy like BlueZ traffic does. Producers call
+update_data at increasing rates and the call latency is reported.
+
+"inline" calls the setters from the producer thread, the way
+update_data worked before the mainloop handoff. "dispatch" is the
+current update_data. Inline latency grows with the D-Bus cost and
+the load, dispatch latency should stay flat.
+
+Usage (on the Pi, from the repository root):
+    python3 benchmarks/ble_update_latency.py [--dbus-cost-ms 2] [--seconds 3]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gi.repository import GLib
+
+from Comms.bluetooth.ble_agent import BLEAgent
+
+
+class SlowCharacteristic:
+    """Stands in for a characteristic, every change costs one D-Bus send"""
+
+    def __init__(self, cost):
+        self.cost = cost
+        self.notifying = True
+        self.calls = 0
+
+    def _send(self):
+        self.calls += 1
+        time.sleep(self.cost)
+        return True
+
+    def set_heart_rate(self, hr):
+        return self._send()
+
+    def set_oxygen_level(self, o2, pulse_rate=None):
+        return self._send()
+
+    def set_vitals(self, hr, o2, timestamp=None, seq=None):
+        return self._send()
+
+
+class History:
+
+    def __init__(self):
+        self.seq = 0
+
+    def record(self, hr, o2, timestamp=None):
+        self.seq = (self.seq + 1) & 0xFFFF
+        return self.seq
+
+
+class LoopApp:
+    """Minimal Application: a GLib mainloop in its own thread"""
+
+    def __init__(self, busy_ms):
+        self.mainloop = GLib.MainLoop()
+        self.busy = busy_ms / 1000.0
+        GLib.timeout_add(10, self._busy)
+        self.thread = threading.Thread(target=self.mainloop.run, daemon=True)
+        self.thread.start()
+
+    def _busy(self):
+        # Other D-Bus work the mainloop does (BlueZ signals, reads)
+        time.sleep(self.busy)
+        return True
+
+    def idle_add(self, callback, *args):
+        return GLib.idle_add(callback, *args)
+
+    def quit(self):
+        self.mainloop.quit()
+
+
+def make_agent(app, cost):
+    agent = BLEAgent()
+    agent._ble_app = app
+    agent._ble_hr_characteristic = SlowCharacteristic(cost)
+    agent._ble_o2_characteristic = SlowCharacteristic(cost)
+    agent._ble_vitals_characteristic = SlowCharacteristic(cost)
+    agent._ble_history_characteristic = History()
+    agent._initialized = True
+    return agent
+
+
+def inline_update(agent, hr, o2):
+    """update_data before the handoff: setters run in the caller's thread"""
+    seq = agent.record_reading(hr, o2)
+    agent._ble_hr_characteristic.set_heart_rate(hr)
+    agent._ble_o2_characteristic.set_oxygen_level(o2, pulse_rate=hr)
+    agent._ble_vitals_characteristic.set_vitals(hr, o2, seq=seq)
+
+
+def producer(update, agent, rate, seconds, samples):
+    interval = 1.0 / rate if rate else 0.0
+    deadline = time.monotonic() + seconds
+    hr = 60
+    while time.monotonic() < deadline:
+        hr = 60 + (hr + 1) % 60
+        start = time.perf_counter()
+        update(agent, hr, 97)
+        samples.append(time.perf_counter() - start)
+        if interval:
+            time.sleep(interval)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run(mode, rate, threads, args):
+    app = LoopApp(args.busy_ms)
+    agent = make_agent(app, args.dbus_cost_ms / 1000.0)
+    update = inline_update if mode == "inline" else BLEAgent.update_data
+
+    samples = []
+    workers = [
+        threading.Thread(target=producer,
+                         args=(update, agent, rate, args.seconds, samples))
+        for _ in range(threads)
+    ]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    time.sleep(0.2)
+    app.quit()
+
+    ms = [s * 1000 for s in samples]
+    applied = agent._ble_vitals_characteristic.calls
+    print(f"{mode:8} {rate or 'max':>6} {threads:>7} {len(ms):>8} "
+          f"{percentile(ms, 0.5):>8.3f} {percentile(ms, 0.99):>8.3f} "
+          f"{max(ms):>8.3f} {applied:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dbus-cost-ms", type=float, default=2.0,
+                        help="Cost of one PropertiesChanged")
+    parser.add_argument("--busy-ms", type=float, default=3.0,
+                        help="Mainloop work every 10 ms")
+    parser.add_argument("--seconds", type=float, default=3.0,
+                        help="Duration of every run")
+    args = parser.parse_args()
+
+    print(f"{'mode':8} {'rate':>6} {'threads':>7} {'calls':>8} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'applied':>8}")
+    for rate, threads in ((1, 1), (10, 1), (100, 1), (100, 4), (0, 4)):
+        for mode in ("inline", "dispatch"):
+            run(mode, rate, threads, args)
+
+
+if __name__ == "__main__":
+    main()
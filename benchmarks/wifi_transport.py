@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+WIFI transport latency and throughput against a local RTDB stand-in
+
+Starts Comms.wifi.local_rtdb in-process, points firebase_admin at it
+through FIREBASE_DATABASE_EMULATOR_HOST and drives Transmitter in four
+modes:
+
+    single      one blocking update per reading, the direct WIFI path
+    concurrent  the direct path from several threads at once
+    uploader    one reading at a time through FirebaseUploader
+    batched     a burst of readings through FirebaseUploader, like a
+                queue drain after an outage
+
+For every mode it reports per-reading latency (p50/p99), readings per
+second and the number of HTTP requests the stand-in served.
+
+Usage (from the repository root):
+    python3 benchmarks/wifi_transport.py [--latency-ms 80] [--jitter-ms 20]
+        [--error-rate 0] [--count 200] [--threads 8]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import firebase_admin
+
+from Comms.wifi.local_rtdb import LocalRTDB
+from Comms.wifi.uploader import FirebaseUploader
+from NetManager.transmitter import Transmitter
+
+NAMESPACE = "ban-net"
+
+
+def reading(i):
+    return {"hr": 60 + i % 40, "spo2": 95 + i % 5, "type": "m",
+            "ts": time.time()}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def timed_send(transmitter, msg):
+    start = time.perf_counter()
+    ok = transmitter.send("WIFI", msg)
+    return time.perf_counter() - start, ok
+
+
+def run_single(args):
+    transmitter = Transmitter(None, None)
+    return [timed_send(transmitter, reading(i)) for i in range(args.count)]
+
+
+def run_concurrent(args):
+    transmitter = Transmitter(None, None)
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        futures = [pool.submit(timed_send, transmitter, reading(i))
+                   for i in range(args.count)]
+        return [f.result() for f in futures]
+
+
+def run_uploader(args):
+    uploader = FirebaseUploader(device_id="bench")
+    uploader.start()
+    try:
+        transmitter = Transmitter(None, None, uploader)
+        return [timed_send(transmitter, reading(i)) for i in range(args.count)]
+    finally:
+        uploader.stop()
+
+
+def run_batched(args):
+    uploader = FirebaseUploader(device_id="bench")
+    uploader.start()
+    transmitter = Transmitter(None, None, uploader)
+    results = []
+    lock = threading.Lock()
+
+    def done(start, future):
+        elapsed = time.perf_counter() - start
+        with lock:
+            results.append((elapsed, future.result()))
+
+    try:
+        for i in range(args.count):
+            start = time.perf_counter()
+            future = transmitter.submit("WIFI", reading(i))
+            future.add_done_callback(lambda f, start=start: done(start, f))
+        while True:
+            with lock:
+                if len(results) == args.count:
+                    return list(results)
+            time.sleep(0.01)
+    finally:
+        uploader.stop()
+
+
+MODES = {
+    "single": run_single,
+    "concurrent": run_concurrent,
+    "uploader": run_uploader,
+    "batched": run_batched
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency-ms", type=float, default=80.0,
+                        help="Round trip added by the stand-in")
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--count", type=int, default=200,
+                        help="Readings sent per mode")
+    parser.add_argument("--threads", type=int, default=8,
+                        help="Workers in concurrent mode")
+    parser.add_argument("--modes", default=",".join(MODES))
+    args = parser.parse_args()
+
+    rtdb = LocalRTDB(port=0, latency=args.latency_ms / 1000.0,
+                     jitter=args.jitter_ms / 1000.0,
+                     error_rate=args.error_rate, seed=1).start()
+    # Must be set before firebase_admin.db opens its client
+    os.environ["FIREBASE_DATABASE_EMULATOR_HOST"] = rtdb.host
+    firebase_admin.initialize_app(options={
+        "databaseURL": f"http://{rtdb.host}?ns={NAMESPACE}"
+    })
+
+    print(f"{'mode':11} {'sent':>6} {'failed':>6} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'msg/s':>8} {'requests':>8}")
+    try:
+        for mode in args.modes.split(","):
+            rtdb.reset_stats()
+            start = time.perf_counter()
+            results = MODES[mode](args)
+            elapsed = time.perf_counter() - start
+
+            ms = [latency * 1000 for latency, _ in results]
+            failed = sum(1 for _, ok in results if not ok)
+            requests = sum(rtdb.requests.values())
+            print(f"{mode:11} {len(results):>6} {failed:>6} "
+                  f"{percentile(ms, 0.5):>8.1f} {percentile(ms, 0.99):>8.1f} "
+                  f"{len(results) / elapsed:>8.1f} {requests:>8}")
+    finally:
+        rtdb.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,43 @@
-import firebase_admin
 import time
+# Reference point for the time to the first delivered reading
+STARTED = time.monotonic()
 import signal
 import sys
-from firebase_admin import db
 from sensor.sensorHRO2 import Sensor
+from sensor.filters import VitalsFilter
 from Comms.bluetooth.ble_agent import BLEAgent
-from Comms.wifi.server import cred
+from Comms.wifi.server import FirebaseConnector
+from Comms.wifi.uploader import FirebaseUploader
 from Comms.lora.lora import LoRaHealthSender
 from NetManager.transmitter import Transmitter
 from NetManager.network_selector import NetworkSelector
+from NetManager.link_prober import LinkProber
 from NetManager.mqueue import MessageQueue
+from NetManager.pipeline import Pipeline
+from NetManager.retransmitter import Retransmitter
+from NetManager.startup import Startup
 import argparse
+import asyncio
 import json
 # Global flag for clean shutdown
 running = True
-
-parser = argparse.ArgumentParser()
+pipeline = None
+
+TRANSPORTS = ("BLE", "LORA", "WIFI")
+# Seconds to wait for BlueZ to register the application and advertisement
+BLE_READY_TIMEOUT = 10
+# Seconds to wait for the first sensor reading
+SENSOR_READY_TIMEOUT = 3
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    epilog="environment:\n"
+           "  FIREBASE_CREDENTIALS   service account JSON, same as --firebase-cred\n"
+           "  FIREBASE_DATABASE_URL  Realtime Database URL, same as --firebase-url\n"
+           "\n"
+           "Without a service account the WIFI network stays disabled and\n"
+           "readings go out over BLE and LoRa only."
+)
 
 parser.add_argument(
     "--demo",
@@ -23,6 +45,34 @@ parser.add_argument(
     default=None
 )
 
+parser.add_argument(
+    "--queue-db",
+    type=str,
+    default="message_queue.db"
+)
+
+parser.add_argument(
+    "--firebase-cred",
+    type=str,
+    default=None,
+    metavar="PATH",
+    help="Firebase service account JSON, required for WIFI uploads "
+         "(default: $FIREBASE_CREDENTIALS)"
+)
+
+parser.add_argument(
+    "--firebase-url",
+    type=str,
+    default=None,
+    help="Realtime Database URL (default: $FIREBASE_DATABASE_URL)"
+)
+
+parser.add_argument(
+    "--lora-ack",
+    action="store_true",
+    help="Request LoRa ACKs from the gateway and retransmit lost frames"
+)
+
 args = parser.parse_args()
 
 def signal_handler(sig, frame):
@@ -30,6 +80,8 @@ def signal_handler(sig, frame):
     global running
     print("\n Received shutdown signal...")
     running = False
+    if pipeline:
+        pipeline.stop()
 
 # Register signal handlers
 signal.signal(signal.SIGINT, signal_handler)
@@ -37,39 +89,50 @@ signal.signal(signal.SIGTERM, signal_handler)
 
 # Main program
 if __name__ == "__main__":
-    # Initialize separate entities
-    sensor = Sensor()
+    # Connect to Firebase in the background, WIFI is used once it is ready
+    firebase = FirebaseConnector(args.firebase_cred, args.firebase_url)
+    if not firebase.configured():
+        print("⚠ No Firebase credentials configured, WIFI uploads are disabled.\n"
+              "  Pass --firebase-cred PATH or set FIREBASE_CREDENTIALS.")
+    firebase.start()
     ble_agent = BLEAgent()
-    lora_sender = None
-    try:
-        # Initialize Firebase
-        if not firebase_admin._apps:
-            firebase_admin.initialize_app(cred, {
-                "databaseURL": "https://ban-net-default-rtdb.europe-west1.firebasedatabase.app/"
-            })
-    except Exception as e:
-        print(f"!!!Unexpected firebse error!!!: {e}")
-        import traceback
-        traceback.print_exc()
-    try:
-        # Start BLE service
-        ble_agent.start()
 
-        #Initialize LoRa
-        lora_sender = LoRaHealthSender(
+    def init_sensor():
+        sensor = Sensor()
+        # Sampling starts right away, no need to wait the full interval
+        sensor.wait_ready(SENSOR_READY_TIMEOUT)
+        return sensor
+
+    def init_ble():
+        return ble_agent.start() and ble_agent.wait_ready(BLE_READY_TIMEOUT) and ble_agent
+
+    def init_lora():
+        lora = LoRaHealthSender(
             device_id="01",
             m0_pin=25,      #  GPIO 25
             m1_pin=23,      #  GPIO 23
             aux_pin=24,     #  GPIO 24
             port='/dev/serial0',
-            baud=9600
+            baud=9600,
+            reliable=args.lora_ack
         )
-        lora_sender.connect()
-    except Exception as e:
-        print(f"LoRa initialization error: {e}")
-        lora_sender = None
+        if not lora.connect():
+            return None
+        return lora
+
+    def init_wifi():
+        return firebase.wait() and firebase
 
-    selector = NetworkSelector(ble_agent, True, lora_sender)
+    # Bring everything up at once, each part is used as soon as it is ready
+    startup = Startup(STARTED)
+    startup.add("sensor", init_sensor)
+    startup.add("BLE", init_ble)
+    startup.add("LORA", init_lora)
+    startup.add("WIFI", init_wifi)
+    startup.start()
+
+    selector = NetworkSelector(ble_agent, True, None)
+    selector.wifi_ready = firebase.is_ready
 
     if args.demo:
 
@@ -78,87 +141,45 @@ if __name__ == "__main__":
             selector.demo = json.load(f)
     else: 
         demo = None
-
-    transmitter = Transmitter(ble_agent, lora_sender)
-    queue = MessageQueue()
-    
-    # Wait a bit for sensor to stabilize
-    time.sleep(2)
+        # Probe links in the background instead of once per message
+        selector.prober = LinkProber(selector)
+        selector.prober.start()
+
+    # Batches WIFI readings into multi-path Firebase updates
+    uploader = FirebaseUploader(device_id="01")
+    uploader.start()
+
+    transmitter = Transmitter(ble_agent, None, uploader)
+    queue = MessageQueue(args.queue_db)
+
+    def lora_ready(lora):
+        selector.lora_sender = lora
+        transmitter.lora = lora
+
+    def ready(timeout):
+        """Sample once the sensor is up and any transport can take a reading"""
+        startup.wait("sensor", timeout)
+        if not startup.finished(["sensor"]):
+            return False
+        return (startup.wait_any(TRANSPORTS, timeout) is not None
+                or startup.finished(TRANSPORTS))
+
+    pipeline = Pipeline(None, selector, transmitter, queue, demo_path=args.demo,
+                        ble_agent=ble_agent, vitals_filter=VitalsFilter(),
+                        started=STARTED, ready=ready)
+    retransmitter = Retransmitter(queue, selector, transmitter)
+
+    startup.on_ready("sensor", lambda sensor: setattr(pipeline, "sensor", sensor))
+    startup.on_ready("LORA", lora_ready)
+    if selector.prober:
+        # Pick up a link as soon as it is up, not at its next probe
+        for net in TRANSPORTS:
+            startup.on_ready(net, lambda _, net=net: selector.prober.refresh(net))
 
     try:
-
-        while running:
-            if args.demo:
-
-                with open(args.demo) as f:
-                    demo = json.load(f)
-
-                readings = {
-                    "heart_rate": demo["heart_rate"],
-                    "spo2": demo["spo2"]
-                }
-            else:
-                readings = sensor.get_readings()
-
-            hr = readings['heart_rate']
-            o2 = readings['spo2']
-            msg_type = selector.classify_message(hr, o2)
-            msg = {"hr": hr, "spo2": o2,"type": msg_type}
-
-
-            success = False
-            best, second = selector.choose_network(msg)
-            
-            success = False
-            if msg["type"] == "w" and best:
-                success1 = transmitter.send(best,msg)
-                success2 = transmitter.send(second, msg) if second else False
-
-                selector.update_stats(best, success1, msg)
-                if second:
-                    selector.update_stats(second, success2, msg)
-
-                success = success1 or success2 
-                
-            elif best:
-                if best == "BLE" and demo and demo["switch"] == True and selector.flag == True:
-                    success = False
-                    transmitter.send(best, msg)
-                    selector.update_stats(best, success, msg)
-                else:
-                    success = transmitter.send(best, msg)
-                    selector.update_stats(best, success, msg)
-
-            if (demo and demo["force_fail"] == True):
-                success = False
-
-            if not success or best is None:
-                queue.add(msg)
-
-
-            battery_msg = ""
-
-            if demo and demo["battery"] < 20:
-                battery_msg = f"\nLow battery percentage: {demo['battery']}%"
-
-            queue_msg = ""
-
-            if not success:
-                queue_msg = "\nTransmission failed, storing message in queue."
-
-            print(
-                    f"_____________________________________________"
-                    f"\nHR:         {hr} "
-                    f"\nSpO2:       {o2} "
-                    f"\nNetwork:    {best if best else 'None available'} "
-                    f"{'and ' + second if msg['type'] == 'w' and second is not None else ''} "
-                    f"\nType:       {'Monitoring' if msg['type'] == 'm' else 'Warning'}"
-                    f"\nSuccess:    {success}"
-                    f"{queue_msg}"
-                    f"{battery_msg}"
-                    f"\n_____________________________________________"
-            )
-            time.sleep(3)
+        retransmitter.start()
+        if running:
+            asyncio.run(pipeline.run())
 
     except KeyboardInterrupt:
         print("\nStopping health monitor...")
@@ -168,8 +189,14 @@ if __name__ == "__main__":
         traceback.print_exc()
     finally:
         # Stop both components
-        sensor.stop()
+        if pipeline.sensor:
+            pipeline.sensor.stop()
+        retransmitter.stop()
+        uploader.stop()
+        if selector.prober:
+            selector.prober.stop()
         ble_agent.stop()
-        if lora_sender:
-            lora_sender.disconnect()
+        if transmitter.lora:
+            transmitter.lora.disconnect()
+        queue.close()
         print("\n✓ Program terminated cleanly")
\ No newline at end of file
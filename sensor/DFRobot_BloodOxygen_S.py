@@ -15,6 +15,7 @@ import time
 import smbus2
 import os
 import math
+import struct
 import RPi.GPIO as GPIO
 from sensor.DFRobot_RTU import *
 
@@ -23,6 +24,33 @@ UART_MODE                 = 0x02
 DEV_ADDRESS               = 0x0020
 DEVICE_ADDRESS            = 0x20
 
+# Registers 0x0C-0x15 in one read: SpO2, SpO2 valid, heart rate (u32),
+# reserved, heart rate valid, board temperature integer and hundredths
+VITALS_REG                = 0x0C
+VITALS_BLOCK              = struct.Struct(">BBIBBBB")
+
+class SensorIOError(IOError):
+  '''!
+    @brief Raised when a register transfer still fails after all retries
+  '''
+
+class VitalsRecord(object):
+  '''!
+    @brief One burst read of the measurement registers
+  '''
+  __slots__ = ("spo2", "spo2_valid", "heartbeat", "heartbeat_valid", "temperature")
+
+  def __init__(self, spo2, spo2_valid, heartbeat, heartbeat_valid, temperature):
+    self.spo2 = spo2
+    self.spo2_valid = spo2_valid
+    self.heartbeat = heartbeat
+    self.heartbeat_valid = heartbeat_valid
+    self.temperature = temperature
+
+  def __repr__(self):
+    return "VitalsRecord(spo2=%d, heartbeat=%d, temperature=%.2f)" % (
+      self.spo2, self.heartbeat, self.temperature)
+
 class DFRobot_BloodOxygen_S(DFRobot_RTU):
   '''!
     @brief This is the base class of the heart rate and oximeter sensor.
@@ -31,6 +59,9 @@ class DFRobot_BloodOxygen_S(DFRobot_RTU):
   heartbeat = 0
   pSPO2 = 0
   pheartbeat = 0
+  SPO2Valid = 0
+  HeartbeatValid = 0
+  temperature = 0.0
   START_MODE = 2
   END_MODE = 3
     
@@ -49,7 +80,11 @@ class DFRobot_BloodOxygen_S(DFRobot_RTU):
       @retval False Init failed
     '''
     global DEV_ADDRESS
-    rbuf = self.read_reg(0x04,2)
+    try:
+      rbuf = self.read_reg(0x04,2)
+    except SensorIOError as e:
+      print("sensor not responding: %s" % e)
+      return False
     if (rbuf[0] & 0xff << 8 | rbuf[1]) == DEV_ADDRESS:
       return True
     else:
@@ -70,19 +105,32 @@ class DFRobot_BloodOxygen_S(DFRobot_RTU):
     self.write_reg(0x20, wbuf)
 
  
+  def read_vitals(self):
+    '''!
+      @brief Read SpO2, heart rate and board temperature in one bus transaction
+      @return VitalsRecord, 0 readings are reported as -1
+      @exception SensorIOError The register block could not be read
+    '''
+    rbuf = self.read_reg(VITALS_REG, VITALS_BLOCK.size)
+    if len(rbuf) != VITALS_BLOCK.size:
+      raise SensorIOError("short read of registers 0x0C-0x15")
+    spo2, spo2_valid, heartbeat, _, heartbeat_valid, temp_int, temp_frac = \
+      VITALS_BLOCK.unpack(bytes(rbuf))
+    return VitalsRecord(spo2 or -1, spo2_valid, heartbeat or -1,
+                        heartbeat_valid, temp_int + temp_frac / 100.0)
+
   def get_heartbeat_SPO2(self):
     '''!
       @brief Get heart rate and oxygen saturation and store them into the struct  sHeartbeatSPO2
+      @return VitalsRecord, the board temperature is stored as well
     '''
-    rbuf = self.read_reg(0x0C,8)
-    SPO2Valid = rbuf[1]
-    HeartbeatValid = rbuf[7]
-    self.SPO2 = rbuf[0]
-    if self.SPO2 == 0:
-      self.SPO2 = -1
-    self.heartbeat = int(rbuf[2]) << 24 | int(rbuf[3]) << 16 | int(rbuf[4]) << 8 | int(rbuf[5])
-    if self.heartbeat == 0:
-      self.heartbeat = -1
+    record = self.read_vitals()
+    self.SPO2 = record.spo2
+    self.SPO2Valid = record.spo2_valid
+    self.heartbeat = record.heartbeat
+    self.HeartbeatValid = record.heartbeat_valid
+    self.temperature = record.temperature
+    return record
 
   def get_temperature_c(self):
     '''!
@@ -90,40 +138,71 @@ class DFRobot_BloodOxygen_S(DFRobot_RTU):
       @return  Return board temp
     '''
     temp_buf = self.read_reg(0x14, 2)
-    Temperature = temp_buf[0] * 1.0 + temp_buf[0] / 100.0
+    Temperature = temp_buf[0] * 1.0 + temp_buf[1] / 100.0
     return Temperature
 
         
 class DFRobot_BloodOxygen_S_i2c(DFRobot_BloodOxygen_S):
   '''
     @brief An example of an i2c interface module
+
+    Every transfer is retried a bounded number of times with exponential
+    backoff, then raises SensorIOError. A bad bus costs one sample
+    instead of blocking the caller. The kernel I2C driver bounds each
+    single attempt with its own timeout.
   '''
-  def __init__(self ,bus ,addr):
+  def __init__(self ,bus ,addr, retries=2, backoff=0.01):
     self.__addr = addr
+    self.retries = retries
+    self.backoff = backoff
+    self.read_errors = 0
+    self.write_errors = 0
+    self.consecutive_errors = 0
     super(DFRobot_BloodOxygen_S_i2c, self).__init__(bus,0)    
+
+  def _transfer(self, what, func, *args):
+    '''
+      @brief run one bus transfer with bounded retries
+      @exception SensorIOError every attempt failed
+    '''
+    delay = self.backoff
+    for attempt in range(self.retries + 1):
+      try:
+        result = func(self.__addr, *args)
+        self.consecutive_errors = 0
+        return result
+      except (OSError, IOError) as e:
+        error = e
+        if attempt < self.retries:
+          time.sleep(delay)
+          delay *= 2
+    self.consecutive_errors += 1
+    raise SensorIOError("%s failed after %d attempts: %s" % (what, self.retries + 1, error))
     
   def write_reg(self, reg_addr, data_buf):
     '''
       @brief writes data to a register
       @param reg register address
       @param value written data
+      @exception SensorIOError the write failed after all retries
     '''
-    while 1:
-      try:
-        self.i2cbus.write_i2c_block_data(self.__addr ,reg_addr ,data_buf)
-        return
-      except:
-        print("please check connect!")
-        time.sleep(1)
+    try:
+      self._transfer("write 0x%02X" % reg_addr,
+                     self.i2cbus.write_i2c_block_data, reg_addr, data_buf)
+    except SensorIOError:
+      self.write_errors += 1
+      raise
 
   def read_reg(self, reg_addr ,length):
     '''
       @brief read the data from the register
       @param reg register address
       @param value read data
+      @exception SensorIOError the read failed after all retries
     '''
     try:
-      rslt = self.i2cbus.read_i2c_block_data(self.__addr ,reg_addr , length)
-    except:
-      rslt = -1
-    return rslt
\ No newline at end of file
+      return self._transfer("read 0x%02X" % reg_addr,
+                            self.i2cbus.read_i2c_block_data, reg_addr, length)
+    except SensorIOError:
+      self.read_errors += 1
+      raise
@@ -0,0 +1,275 @@
+import warnings
+from array import array
+from bisect import bisect_left, insort
+
+# Readings outside these ranges are sensor glitches, not physiology
+HR_RANGE = (20, 250)
+SPO2_RANGE = (50, 100)
+
+# Scale factor turning the MAD into a standard deviation estimate
+MAD_SCALE = 1.4826
+
+
+class RollingWindow:
+    """
+    Fixed-size window of the last values with a sorted copy
+
+    Values live in a preallocated ring array, the sorted copy is kept
+    up to date with bisect, so every push is O(window) memory moves
+    with no allocation and the rolling median is read by index. The MAD
+    still sorts the deviations on every call, which for a 5 sample
+    window is cheaper than keeping a second sorted copy.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._ring = array("d", [0.0]) * size
+        self._sorted = array("d")
+        self._next = 0
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def push(self, value):
+        if len(self._sorted) == self.size:
+            old = self._ring[self._next]
+            del self._sorted[bisect_left(self._sorted, old)]
+        self._ring[self._next] = value
+        self._next = (self._next + 1) % self.size
+        insort(self._sorted, value)
+
+    def median(self):
+        n = len(self._sorted)
+        mid = n // 2
+        if n % 2:
+            return self._sorted[mid]
+        return (self._sorted[mid - 1] + self._sorted[mid]) / 2.0
+
+    def mad(self, center):
+        """Median absolute deviation around center"""
+        deviations = sorted(abs(v - center) for v in self._sorted)
+        n = len(deviations)
+        mid = n // 2
+        if n % 2:
+            return deviations[mid]
+        return (deviations[mid - 1] + deviations[mid]) / 2.0
+
+    def clear(self):
+        del self._sorted[:]
+        self._next = 0
+
+
+class ChannelFilter:
+    """
+    Hampel outlier rejection and smoothing for one signal
+
+    A value further than k scaled MADs from the rolling median of the
+    raw values before it is replaced by that median. Only the first of
+    a run of outliers on the same side is replaced, the second one shows
+    a real change, so a sustained drop is reported one sample late at
+    most.
+
+    The cleaned values then go through an EMA that only averages the
+    jitter within k scaled MADs. A real change restarts it at the new
+    value, so smoothing adds no delay to a step. Missing readings (-1
+    or out of range) hold the last output for max_hold samples, then
+    report -1.
+    """
+
+    def __init__(self, valid_range, window=5, k=3.0, mad_floor=1.0,
+                 max_hold=3, alpha=0.5):
+        self.low, self.high = valid_range
+        self.raw = RollingWindow(window)
+        self.k = k
+        self.mad_floor = mad_floor
+        self.max_hold = max_hold
+        self.alpha = alpha
+
+        self.last = None
+        self.smooth = None
+        self.suspect = None
+        self.missing = 0
+        self.rejected = 0
+
+    def update(self, value):
+        if value is None or not self.low <= value <= self.high:
+            self.missing += 1
+            if self.last is not None and self.missing <= self.max_hold:
+                return self.last
+            return -1
+        self.missing = 0
+
+        cleaned = value
+        changed = False
+        if len(self.raw) >= 3:
+            median = self.raw.median()
+            spread = max(MAD_SCALE * self.raw.mad(median), self.mad_floor)
+            deviation = value - median
+            if abs(deviation) > self.k * spread:
+                # Unless the sample before was off the same way, then
+                # the change is real
+                if self.suspect is None or (self.suspect > 0) != (deviation > 0):
+                    cleaned = median
+                    self.rejected += 1
+                else:
+                    changed = True
+                self.suspect = deviation
+            else:
+                self.suspect = None
+
+        self.raw.push(value)
+        if self.smooth is None or changed:
+            self.smooth = cleaned
+        else:
+            self.smooth += self.alpha * (cleaned - self.smooth)
+        self.last = int(round(self.smooth))
+        return self.last
+
+    def reset(self):
+        self.raw.clear()
+        self.last = None
+        self.smooth = None
+        self.suspect = None
+        self.missing = 0
+
+
+class VitalsFilter:
+    """
+    Streaming signal-quality filter between the Sensor and the selector
+
+    Cleans every HR/SpO2 pair as it arrives so that single glitches and
+    -1 sentinels do not turn into warnings. Constant work per sample.
+    """
+
+    def __init__(self, window=5, k=3.0, max_hold=3, alpha=0.5):
+        """
+        Initialize filter
+
+        Args:
+            window: Samples in the Hampel window
+            k: Hampel threshold in scaled MADs
+            max_hold: Missing readings bridged with the last value
+            alpha: EMA weight of the newest sample within the jitter band
+        """
+        self.hr = ChannelFilter(HR_RANGE, window, k, max_hold=max_hold,
+                                alpha=alpha)
+        self.spo2 = ChannelFilter(SPO2_RANGE, window, k, max_hold=max_hold,
+                                  alpha=alpha)
+
+    def update(self, hr, spo2):
+        """
+        Filter one reading
+
+        Returns:
+            tuple: (hr, spo2) as ints, -1 where there is no usable reading
+        """
+        return self.hr.update(hr), self.spo2.update(spo2)
+
+    def reset(self):
+        self.hr.reset()
+        self.spo2.reset()
+
+    def stats(self):
+        return {
+            "hr_rejected": self.hr.rejected,
+            "spo2_rejected": self.spo2.rejected
+        }
+
+
+# ------------------------------
+# BATCH MODE
+# ------------------------------
+def _smooth(np, x, restart, alpha, span=32):
+    """
+    EMA of x that restarts at the value wherever restart is set
+
+    Computed over the last span samples at once, older samples are given
+    the weight (1 - alpha) ** span that is left, which with the default
+    alpha is below any rounding.
+    """
+    n = len(x)
+    index = np.arange(n)
+    first = np.maximum.accumulate(np.where(restart, index, 0))
+
+    # Samples before the restart of their segment count as its first value
+    lags = np.arange(span)
+    source = np.maximum(index[:, None] - lags, first[:, None])
+    weights = alpha * (1 - alpha) ** lags
+    weights[-1] = (1 - alpha) ** (span - 1)
+    return x[source] @ weights
+
+
+def _filter_channel(np, values, valid_range, window, k, mad_floor, alpha):
+    x = np.asarray(values, dtype=float)
+    if len(x) == 0:
+        return np.array([], dtype=int), 0
+    low, high = valid_range
+    x[(x < low) | (x > high)] = np.nan
+    windows = np.lib.stride_tricks.sliding_window_view
+
+    with warnings.catch_warnings():
+        # All-NaN windows (no valid history yet) are expected
+        warnings.simplefilter("ignore", RuntimeWarning)
+
+        # The window values before every sample, NaN-padded at the start
+        before = windows(np.concatenate([np.full(window, np.nan), x[:-1]]), window)
+        median = np.nanmedian(before, axis=1)
+        mad = np.nanmedian(np.abs(before - median[:, None]), axis=1)
+        spread = np.maximum(MAD_SCALE * mad, mad_floor)
+        enough = np.count_nonzero(~np.isnan(before), axis=1) >= 3
+        deviation = x - median
+        outlier = enough & (np.abs(deviation) > k * spread)
+
+    # Only the first of a run of outliers on the same side is replaced
+    after_outlier = np.concatenate([[False], outlier[:-1]])
+    same_side = np.concatenate([[False], np.sign(deviation[1:]) == np.sign(deviation[:-1])])
+    rejected = outlier & ~(after_outlier & same_side)
+
+    cleaned = np.where(rejected, median, x)
+    valid = ~np.isnan(x)
+    # The EMA restarts on real changes and, unlike the stream, after gaps
+    after_gap = np.concatenate([[True], ~valid[:-1]])
+    smooth = _smooth(np, cleaned, (outlier & ~rejected) | after_gap | ~valid,
+                     alpha)
+
+    out = np.full(len(x), -1, dtype=int)
+    out[valid] = np.rint(smooth[valid]).astype(int)
+    return out, int(rejected.sum())
+
+
+def filter_trace(hr, spo2, window=5, k=3.0, mad_floor=1.0, alpha=0.5):
+    """
+    Filter a recorded trace in one go with NumPy
+
+    Same Hampel rejection and smoothing as VitalsFilter, with every
+    window computed at once. Missing readings are reported as -1 instead
+    of being held, windows span samples rather than valid readings and
+    the EMA restarts after a gap, so results differ from the streaming
+    filter only around gaps.
+
+    Args:
+        hr: Sequence of heart rate readings
+        spo2: Sequence of SpO2 readings of the same length
+
+    Returns:
+        dict: "hr" and "spo2" integer arrays (-1 = no reading) and the
+        number of rejected outliers per signal
+
+    Raises:
+        ImportError: If NumPy is not installed
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError("filter_trace needs NumPy: pip install numpy")
+
+    hr_out, hr_rejected = _filter_channel(np, hr, HR_RANGE, window, k,
+                                          mad_floor, alpha)
+    spo2_out, spo2_rejected = _filter_channel(np, spo2, SPO2_RANGE, window, k,
+                                              mad_floor, alpha)
+    return {
+        "hr": hr_out,
+        "spo2": spo2_out,
+        "hr_rejected": hr_rejected,
+        "spo2_rejected": spo2_rejected
+    }
@@ -0,0 +1,193 @@
+import threading
+import time
+from array import array
+
+# Bits of the valid flags stored with every sample
+VALID_HR = 0x01
+VALID_SPO2 = 0x02
+
+# Sensor states seen by the rest of the pipeline
+OK = "ok"
+DEGRADED = "degraded"
+FAILED = "failed"
+
+
+class SampleRing:
+    """
+    Preallocated ring buffer of (monotonic_ts, hr, spo2, flags) samples
+
+    Every field lives in its own array, so appending never allocates.
+    One thread writes, any number of threads read without a lock: the
+    write counter is bumped only after a slot is filled, and readers
+    retry if the writer lapped them while they were copying.
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.ts = array("d", [0.0]) * capacity
+        self.hr = array("i", [-1]) * capacity
+        self.spo2 = array("i", [-1]) * capacity
+        self.flags = array("B", [0]) * capacity
+        self._written = 0
+
+    def __len__(self):
+        return min(self._written, self.capacity - 1)
+
+    def append(self, ts, hr, spo2, flags):
+        """Store one sample, only call from the writer thread"""
+        i = self._written % self.capacity
+        self.ts[i] = ts
+        self.hr[i] = hr
+        self.spo2[i] = spo2
+        self.flags[i] = flags
+        self._written += 1
+
+    def _copy(self, start, end):
+        return [
+            (self.ts[i % self.capacity], self.hr[i % self.capacity],
+             self.spo2[i % self.capacity], self.flags[i % self.capacity])
+            for i in range(start, end)
+        ]
+
+    def last(self, n):
+        """
+        The newest n samples, oldest first
+
+        At most capacity - 1 are returned, the remaining slot is the one
+        the writer may be filling.
+
+        Returns:
+            list: (monotonic_ts, hr, spo2, flags) tuples
+        """
+        while True:
+            end = self._written
+            start = max(0, end - min(n, self.capacity - 1))
+            samples = self._copy(start, end)
+            # The slots read are intact unless the writer reached them
+            if self._written - start < self.capacity:
+                return samples
+
+    def latest(self):
+        """The newest sample, or None if nothing was sampled yet"""
+        samples = self.last(1)
+        return samples[0] if samples else None
+
+    def window(self, seconds, now=None):
+        """Samples taken in the last seconds, oldest first"""
+        if now is None:
+            now = time.monotonic()
+        cutoff = now - seconds
+        return [s for s in self.last(self.capacity) if s[0] >= cutoff]
+
+
+class Sampler:
+    """
+    Background thread polling the SpO2/HR sensor at a fixed rate
+
+    Readings go into a SampleRing, so consumers get the latest value or
+    a window of history without waiting for an I2C transaction. Polls
+    are scheduled on a fixed grid, a slow read does not shift the ones
+    after it.
+
+    A failed read costs that one sample. After degrade_after failures
+    in a row the state becomes DEGRADED until a read succeeds again.
+    """
+
+    def __init__(self, device, interval=1.0, capacity=256, degrade_after=3):
+        """
+        Initialize sampler
+
+        Args:
+            device: DFRobot_BloodOxygen_S instance, already collecting
+            interval: Seconds between polls
+            capacity: Samples kept in the ring buffer
+            degrade_after: Consecutive failed reads before DEGRADED
+        """
+        self.device = device
+        self.interval = interval
+        self.ring = SampleRing(capacity)
+        self.degrade_after = degrade_after
+
+        self.state = OK
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.last_error = None
+        self.temperature = None
+        self._sampled = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def sample_once(self):
+        """Poll the sensor and store the reading"""
+        record = self.device.get_heartbeat_SPO2()
+        flags = 0
+        if record.heartbeat_valid:
+            flags |= VALID_HR
+        if record.spo2_valid:
+            flags |= VALID_SPO2
+        self.ring.append(time.monotonic(), record.heartbeat, record.spo2, flags)
+        self.temperature = record.temperature
+
+    def _record_success(self):
+        self._sampled.set()
+        self.consecutive_errors = 0
+        if self.state != OK:
+            self.state = OK
+            print("[Sampler] Sensor recovered")
+
+    def _record_error(self, error):
+        self.errors += 1
+        self.consecutive_errors += 1
+        self.last_error = error
+        if self.state == OK and self.consecutive_errors >= self.degrade_after:
+            self.state = DEGRADED
+            print(f"[Sampler] Sensor degraded after "
+                  f"{self.consecutive_errors} failed reads: {error}")
+
+    def _worker(self):
+        next_poll = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.sample_once()
+                self._record_success()
+            except Exception as e:
+                self._record_error(e)
+
+            next_poll += self.interval
+            delay = next_poll - time.monotonic()
+            if delay < 0:
+                # Fell behind, skip the missed slots instead of bursting
+                next_poll += -delay // self.interval * self.interval + self.interval
+                delay = next_poll - time.monotonic()
+            self._stop.wait(delay)
+
+    # ------------------------------
+    # CONSUMERS
+    # ------------------------------
+    def wait_sample(self, timeout=None):
+        """Wait for the first successful read, returns True once there is one"""
+        return self._sampled.wait(timeout)
+
+    def latest(self, max_age=None):
+        """Newest sample, None if there is none younger than max_age seconds"""
+        sample = self.ring.latest()
+        if sample is None or max_age is None:
+            return sample
+        return sample if time.monotonic() - sample[0] <= max_age else None
+
+    def window(self, seconds):
+        return self.ring.window(seconds)
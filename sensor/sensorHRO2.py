@@ -3,21 +3,36 @@ import atexit
 import time
 import json
 import os
-from sensor.DFRobot_BloodOxygen_S import DFRobot_BloodOxygen_S_i2c
+from sensor.DFRobot_BloodOxygen_S import DFRobot_BloodOxygen_S_i2c, SensorIOError
+from sensor.sampler import Sampler, OK, DEGRADED, FAILED
 
 
 class Sensor:
     """Pure sensor class for heart rate and SpO2 monitoring without BLE dependencies"""
 
-    def __init__(self):
+    def __init__(self, sample_interval=1.0):
+        """
+        Initialize sensor
+
+        Args:
+            sample_interval: Seconds between background polls, None reads
+                the sensor inline in every get_readings() call
+        """
         self._sensor = DFRobot_BloodOxygen_S_i2c(1, 0x57)
         self._initialized = False
         self._running = False
+        self.sampler = None
+        self.sample_interval = sample_interval
+        # Inline mode only, the sampler tracks its own errors
+        self._inline_errors = 0
 
-        if self._sensor.begin():
-            self._sensor.sensor_start_collect()
+        if self._sensor.begin() and self._start_collect():
             self._initialized = True
             self._running = True
+
+            if sample_interval is not None:
+                self.sampler = Sampler(self._sensor, interval=sample_interval)
+                self.sampler.start()
             print("✓ Sensor started successfully")
 
             # Register cleanup handler only
@@ -25,6 +40,37 @@ class Sensor:
         else:
             print("✗ Sensor initialization failed!")
 
+    def _start_collect(self):
+        try:
+            self._sensor.sensor_start_collect()
+            return True
+        except SensorIOError as e:
+            print(f"✗ Sensor start failed: {e}")
+            return False
+
+    @property
+    def state(self):
+        """OK, DEGRADED while reads keep failing, FAILED if never started"""
+        if not self._initialized:
+            return FAILED
+        if self.sampler:
+            return self.sampler.state
+        return DEGRADED if self._inline_errors >= 3 else OK
+
+    def wait_ready(self, timeout=None):
+        """
+        Wait until the first reading is available
+
+        Returns:
+            bool: True once get_readings() has a sample, False if the
+            sensor failed or nothing was read within timeout
+        """
+        if not self._initialized:
+            return False
+        if self.sampler:
+            return self.sampler.wait_sample(timeout)
+        return True
+
     def cleanup(self):
         """Properly shutdown sensor"""
         if not self._running:
@@ -32,10 +78,16 @@ class Sensor:
 
         print("🛑 Cleaning up sensor...")
 
+        if self.sampler:
+            self.sampler.stop()
+
         # Stop sensor
         if self._initialized:
             print("Stopping sensor...")
-            self._sensor.sensor_end_collect()
+            try:
+                self._sensor.sensor_end_collect()
+            except SensorIOError as e:
+                print(f"✗ Sensor stop failed: {e}")
             time.sleep(0.5)
             self._initialized = False
 
@@ -53,16 +105,41 @@ class Sensor:
         self.cleanup()
 
     def get_readings(self):
-        """Get current sensor readings"""
+        """Get current sensor readings, the latest sample when sampling"""
         if not self._initialized or not self._running:
             return None
 
-        self._sensor.get_heartbeat_SPO2()
+        if self.sampler:
+            # A sample older than a few polls means reads are failing
+            sample = self.sampler.latest(max_age=3 * self.sample_interval)
+            if sample is None:
+                return None
+            ts, hr, spo2, flags = sample
+            return {
+                'heart_rate': hr,
+                'spo2': spo2,
+                'timestamp': ts,
+                'valid': flags
+            }
+
+        try:
+            self._sensor.get_heartbeat_SPO2()
+        except SensorIOError as e:
+            self._inline_errors += 1
+            print(f"✗ Sensor read failed: {e}")
+            return None
+        self._inline_errors = 0
         return {
             'heart_rate': self._sensor.heartbeat,
             'spo2': self._sensor.SPO2
         }
 
+    def get_window(self, seconds):
+        """Samples from the last seconds as (monotonic_ts, hr, spo2, flags)"""
+        if not self.sampler:
+            return []
+        return self.sampler.window(seconds)
+
     def write_data(self, readings):
         """Write sensor data to shared file"""
         if not self._running:
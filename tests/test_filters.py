@@ -0,0 +1,24 @@
+from NetManager.classifier import CRITICAL, VitalsClassifier
+from sensor.filters import VitalsFilter
+
+
+def first_critical(spo2_trace, hr=70):
+    """Index of the first sample classified CRITICAL, None if never"""
+    vitals_filter = VitalsFilter()
+    classifier = VitalsClassifier()
+    for i, spo2 in enumerate(spo2_trace):
+        filtered_hr, filtered_spo2 = vitals_filter.update(hr, spo2)
+        if classifier.update(filtered_hr, filtered_spo2, now=float(i)) == CRITICAL:
+            return i
+    return None
+
+
+def test_spo2_step_is_critical_after_one_held_sample():
+    drop = 10
+    trace = [97] * drop + [84] * 10
+    assert first_critical(trace) == drop + 1
+
+
+def test_single_glitch_is_rejected():
+    trace = [97] * 10 + [84] + [97] * 10
+    assert first_critical(trace) is None
@@ -0,0 +1,63 @@
+import threading
+
+from NetManager.startup import Startup
+
+
+def blocked(result):
+    """Init function that returns result once the event is set"""
+    release = threading.Event()
+
+    def init():
+        release.wait(5)
+        return result
+
+    return init, release
+
+
+def failing():
+    raise OSError("no device")
+
+
+def test_wait_any_returns_the_first_ready():
+    slow, release_slow = blocked("slow")
+    fast, release_fast = blocked("fast")
+    startup = Startup()
+    startup.add("LORA", slow)
+    startup.add("WIFI", fast)
+    startup.start()
+
+    release_fast.set()
+    assert startup.wait_any(["LORA", "WIFI"], timeout=5) == "WIFI"
+    assert not startup.is_ready("LORA")
+    release_slow.set()
+
+
+def test_failures_are_reported_without_waiting_for_the_timeout():
+    startup = Startup()
+    startup.add("SENSOR", failing)
+    startup.add("BLE", lambda: None)
+    startup.start()
+
+    assert startup.wait_any(["SENSOR", "BLE"], timeout=5) is None
+    assert startup.wait("SENSOR", timeout=5) is None
+    assert startup.finished(["SENSOR", "BLE"])
+    assert isinstance(startup.errors["SENSOR"], OSError)
+    assert isinstance(startup.errors["BLE"], RuntimeError)
+
+
+def test_callbacks_run_before_the_result_is_published():
+    init, release = blocked("ble")
+    startup = Startup()
+    startup.add("BLE", init)
+    seen = []
+    startup.on_ready("BLE", lambda ble: seen.append(
+        (ble, startup.is_ready("BLE"))))
+    startup.start()
+
+    release.set()
+    assert startup.wait("BLE", timeout=5) == "ble"
+    assert seen == [("ble", False)]
+
+    # Registered after the fact, runs right away
+    startup.on_ready("BLE", seen.append)
+    assert seen[-1] == "ble"